@@ -15,7 +15,7 @@ bl_info = {
     "name" : "BakeLab",
     "author" : "Shahzod Boyxonov (specoolar@gmail.com)",
     "description" : "Bake textures easily",
-    "blender" : (2, 81, 0),
+    "blender" : (3, 2, 0),
     "version" : (2, 0, 1),
     "location" : "View3D > Properties > BakeLab",
     "category" : "Baking"
@@ -29,6 +29,15 @@ if "bpy" in locals():
     importlib.reload(bakelab_post)
     importlib.reload(bakelab_map)
     importlib.reload(bakelab_ui)
+    importlib.reload(bakelab_job)
+    importlib.reload(bakelab_farm)
+    importlib.reload(bakelab_hash)
+    importlib.reload(bakelab_plan)
+    importlib.reload(bakelab_cache)
+    importlib.reload(bakelab_history)
+    importlib.reload(bakelab_trace)
+    importlib.reload(bakelab_accumulate)
+    importlib.reload(bakelab_nodes)
 else:
     from . import bakelab_bake
     from . import bakelab_uv
@@ -36,6 +45,15 @@ else:
     from . import bakelab_post
     from . import bakelab_map
     from . import bakelab_ui
+    from . import bakelab_job
+    from . import bakelab_farm
+    from . import bakelab_hash
+    from . import bakelab_plan
+    from . import bakelab_cache
+    from . import bakelab_history
+    from . import bakelab_trace
+    from . import bakelab_accumulate
+    from . import bakelab_nodes
 
 import bpy
 
@@ -88,6 +106,55 @@ class BakeLabProperties(PropertyGroup):
             name = 'Cage Extrusion', default = 0.05,
             min = 0, soft_max = 1
         )
+    batch_bake : BoolProperty(
+            name = 'Batch Objects', default = True,
+            description = 'Bake all objects with one cycles call per map',
+        )
+    incremental_bake : BoolProperty(
+            name = 'Skip Unchanged', default = False,
+            description = 'Reuse images whose object, materials and bake settings did not change since they were baked. Maps lit by the scene, like Combined or AO, are always baked again',
+        )
+    share_identical : BoolProperty(
+            name = 'Share Identical Objects', default = True,
+            description = 'Bake objects with the same mesh, materials and modifiers once and share their images',
+        )
+    use_bake_cache : BoolProperty(
+            name = 'Bake Cache', default = False,
+            description = 'Keep baked images in a folder shared between files and reuse them when the same bake is requested again',
+        )
+    cache_path : StringProperty(
+            name = 'Cache Folder',
+            default = "",
+            subtype = "DIR_PATH"
+        )
+    cache_size_limit : IntProperty(
+            name = 'Cache Size (MB)',
+            description = 'Least recently used images are removed when the cache grows past this size (0 = no limit)',
+            default = 4096,
+            min = 0
+        )
+    use_bake_history : BoolProperty(
+            name = 'Bake History', default = True,
+            description = 'Record how long bakes take in the Blender config folder and estimate the time of new bakes from them',
+        )
+    use_trace : BoolProperty(
+            name = 'Trace', default = False,
+            description = 'Write a Chrome trace of the bake stages and of the material operators next to the saved images, or next to the blend file when packing. Tracing Python memory slows the bake down',
+        )
+    pack_scalar_passes : BoolProperty(
+            name = 'Pack Scalar Passes', default = False,
+            description = 'Bake up to three Non-Color custom passes in one run, one per color channel, and split them into their images. Only passes that resolve to single value inputs in every material are packed',
+        )
+    tiled_bake : BoolProperty(
+            name = 'Tiled', default = False,
+            description = 'Bake large images a tile at a time, so memory depends on the tile size instead of the image size',
+        )
+    tile_size : IntProperty(
+            name = 'Tile Size',
+            description = 'Largest tile baked at once, in pixels including anti-aliasing',
+            default = 4096,
+            min = 64, soft_max = 16384
+        )
     pre_join_mesh : BoolProperty(
             name = 'Pre-Join Meshes', default = False,
             description = 'Create one merged mesh and bake to it using ray-tracing',
@@ -109,6 +176,10 @@ class BakeLabProperties(PropertyGroup):
             default = 100,
             min = 0
         )
+    crop_uv_bounds : BoolProperty(
+            name = 'Crop to UVs', default = False,
+            description = 'Bake only the bounds of the UV islands, images may be non-square and generated materials map the UVs into them',
+        )
     image_min_size    : IntProperty(
             name = 'Min Size',
             default = 32,
@@ -130,6 +201,14 @@ class BakeLabProperties(PropertyGroup):
             description = 'Anti-aliasing (1 = No Anti-aliasing)',
             min = 1, soft_max = 8
         )
+    aa_mode : EnumProperty(
+            name = 'Anti-aliasing Mode',
+            items = (
+                ('SUPERSAMPLE', 'Supersample', 'Bake a larger image and scale it down'),
+                ('ACCUMULATE',  'Accumulate',  'Average jittered passes baked at the final size, uses less memory')
+            ),
+            default = 'SUPERSAMPLE'
+        )
     bake_margin    : IntProperty(
             name = 'Bake Margin',
             description = 'Extends the baked result as a post process filter',
@@ -174,6 +253,55 @@ class BakeLabProperties(PropertyGroup):
                 subtype="DIR_PATH",
                 update=updateSavePath
             )
+    memory_budget : IntProperty(
+        name = 'Memory Budget (MB)',
+        description = 'Estimated peak memory allowed for a bake (0 = no budget)',
+        default = 0,
+        min = 0
+    )
+    memory_strategy : EnumProperty(
+        name = 'Over Budget',
+        items = (
+            ('WARN',  'Warn',  'Only report that the bake may not fit'),
+            ('ADAPT', 'Adapt', 'Free finished images, then switch to accumulated anti-aliasing and tiles until the bake fits')
+        ),
+        default = 'WARN'
+    )
+    use_bake_farm : BoolProperty(
+        name = 'Bake Farm',
+        description = 'Split the bake into jobs and run them in background blender processes',
+        default = False
+    )
+    farm_workers : IntProperty(
+        name = 'Workers',
+        description = 'Number of blender processes baking at the same time',
+        default = 4,
+        min = 1, soft_max = 32
+    )
+    farm_threads : IntProperty(
+        name = 'Threads',
+        description = 'Render threads per worker (0 to split all cores between workers)',
+        default = 0,
+        min = 0, soft_max = 64
+    )
+    farm_objects_per_job : IntProperty(
+        name = 'Objects Per Job',
+        description = 'Objects baked by one worker process (Individual mode)',
+        default = 4,
+        min = 1, soft_max = 64
+    )
+    farm_timeout : IntProperty(
+        name = 'Timeout',
+        description = 'Seconds before a job is killed (0 = no timeout)',
+        default = 0,
+        min = 0
+    )
+    farm_retries : IntProperty(
+        name = 'Retries',
+        description = 'Times a failed job is restarted',
+        default = 1,
+        min = 0, soft_max = 5
+    )
     show_bake_settings : BoolProperty(name = '', default = False)
     show_map_settings  : BoolProperty(name = '', default = False)
     show_file_settings : BoolProperty(name = '', default = False)
@@ -221,11 +349,47 @@ class BakeLabProperties(PropertyGroup):
             name = 'Current baking size',
             default = ""
         )
+    baking_farm_status : StringProperty(
+            name = 'Bake farm status',
+            default = ""
+        )
+    baking_eta : StringProperty(
+            name = 'Remaining time',
+            default = ""
+        )
+    baking_throughput : StringProperty(
+            name = 'Baked texels per second',
+            default = ""
+        )
+    plan_job_count : IntProperty(
+            name = 'Planned images',
+            default = 0
+        )
+    plan_cost : StringProperty(
+            name = 'Estimated cost',
+            default = ""
+        )
+    plan_time : StringProperty(
+            name = 'Estimated time',
+            default = ""
+        )
+    plan_uv_coverage : StringProperty(
+            name = 'UV Coverage'
+        )
+    plan_memory : StringProperty(
+            name = 'Estimated peak memory',
+            default = ""
+        )
+    plan_error : StringProperty(
+            name = 'Plan error',
+            default = ""
+        )
 
 classes = (
     BakeLabProperties,
     
     bakelab_bake.Baker,
+    bakelab_plan.BakeLab_Plan,
     bakelab_uv.Unwrapper,
     bakelab_uv.ClearUV,
     bakelab_post.BakeLab_GenerateMaterials,
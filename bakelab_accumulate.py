@@ -0,0 +1,36 @@
+import numpy as np
+
+class PixelAccumulator:
+    """Running mean and variance of an image's pixels over several bakes (Welford)"""
+    def __init__(self, image):
+        self.image = image
+        width, height = image.size
+        self.buffer = np.empty(width * height * 4, dtype = np.float32)
+        self.mean   = np.zeros((width * height, 4), dtype = np.float32)
+        self.m2     = np.zeros((width * height, 3), dtype = np.float32)
+        self.count  = 0
+
+    def Add(self):
+        self.image.pixels.foreach_get(self.buffer)
+        pixels = self.buffer.reshape(-1, 4)
+        self.count += 1
+        delta = pixels - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta[:, :3] * (pixels[:, :3] - self.mean[:, :3])
+
+    def Noise(self):
+        # Standard error of each texel's mean, worst color channel
+        if self.count < 2:
+            return None
+        variance = self.m2.max(axis = 1) / (self.count - 1)
+        return np.sqrt(variance / self.count)
+
+    def Converged(self, threshold):
+        # 1% of texels may stay above the threshold, fireflies would never settle
+        noise = self.Noise()
+        if noise is None:
+            return False
+        return np.count_nonzero(noise > threshold) <= noise.size * 0.01
+
+    def Write(self):
+        self.image.pixels.foreach_set(self.mean.ravel())
@@ -1,5 +1,9 @@
 import os
 import bpy
+import time
+import shutil
+import tempfile
+import numpy as np
 
 from bpy.types import (
             Operator, 
@@ -16,13 +20,56 @@ from bpy.props import (
             CollectionProperty
         )
 
-from math import log2
 from os.path import abspath, join, exists
 
 from .bakelab_tools import (
-    SelectObject,
+    SplitPassNames,
+    FindPassInput,
     SelectObjects,
-    IsValidMesh
+    ObjectContext,
+    AddMaterialSlot,
+    RenderUVLayer,
+    CornerNormals
+)
+from .bakelab_map import (
+    MapToDict,
+    MapProfile,
+    ImageExtension,
+    DENOISE_MAPS,
+    CYCLES_PROFILES,
+    CYCLES_PROFILE_SETTINGS
+)
+from .bakelab_farm import BakeFarm
+from .bakelab_plan import (
+    BuildPlan,
+    FormatCount,
+    FormatSeconds
+)
+from .bakelab_hash import (
+    HASH_KEY,
+    TagImage,
+    MergedMeshHash
+)
+from .bakelab_cache import (
+    IsCacheable,
+    OpenBakeCache
+)
+from .bakelab_baked_data import (
+    CONSTANT_KEY,
+    CROP_KEY
+)
+from .bakelab_accumulate import PixelAccumulator
+from .bakelab_nodes import NodeFlattener
+from .bakelab_history import (
+    DeviceKey,
+    BakeProgress,
+    OpenBakeHistory
+)
+from .bakelab_trace import (
+    ImageArgs,
+    NullTracer,
+    OpenTracer,
+    TraceDir
 )
     
 class Baker(Operator):
@@ -33,8 +80,23 @@ class Baker(Operator):
     bl_options = {'REGISTER', 'UNDO'}
     
     _timer = None
+    _bake_handlers = None
+    bake_status = 'FINISHED'
+    synchronous = False
+    farm = None
+    bake_cache = None
+    history = None
+    progress = None
+    tracer = NullTracer()
+    free_buffers = False
+    TIMER_STEP  = 0.01 # Seconds between modal ticks
+    STEP_BUDGET = 0.05 # Seconds of setup work allowed per tick
     TMP_EMPTY_MAT_NAME = "BAKELAB_TMP_EMPTY_MAT"
     TMP_IMAGE_NODE_NAME = "BAKELAB_TMP_IMAGE_NODE"
+    TMP_DENOISE_SCENE_NAME = "BAKELAB_TMP_DENOISE"
+    TMP_TILE_IMAGE_NAME = "BAKELAB_TMP_TILE"
+    TMP_UV_NAME = "BAKELAB_TMP_UV"
+    TMP_MERGED_MESH_NAME = "BAKELAB_MERGED_MESH_TMP"
     
     def save_defaults(self, context):
         scene = context.scene
@@ -57,6 +119,10 @@ class Baker(Operator):
         self.default_engine = render.engine
         self.default_cycles_device = scene.cycles.device
         self.default_cycles_pause = scene.cycles.preview_pause
+        self.default_cycles_profile = {
+            key: getattr(scene.cycles, key)
+            for key in CYCLES_PROFILE_SETTINGS if hasattr(scene.cycles, key) # Light tree is 3.5+
+        }
         # }
         
         # Bake settings{
@@ -67,6 +133,7 @@ class Baker(Operator):
         self.default_cage_extrusion = bake_settings.cage_extrusion
         self.default_bake_margin    = bake_settings.margin
         self.default_samples = scene.cycles.samples
+        self.default_seed = scene.cycles.seed
         self.default_normal_space = bake_settings.normal_space
         
         self.default_use_pass_direct   = bake_settings.use_pass_direct
@@ -105,6 +172,8 @@ class Baker(Operator):
         render.engine = self.default_engine
         scene.cycles.device = self.default_cycles_device
         scene.cycles.preview_pause = self.default_cycles_pause
+        for key, value in self.default_cycles_profile.items():
+            setattr(scene.cycles, key, value)
         # }
         
         # Bake settings{
@@ -115,6 +184,7 @@ class Baker(Operator):
         bake_settings.cage_extrusion = self.default_cage_extrusion
         bake_settings.margin  = self.default_bake_margin
         scene.cycles.samples = self.default_samples
+        scene.cycles.seed = self.default_seed
         bake_settings.normal_space             = self.default_normal_space
         
         bake_settings.use_pass_direct          = self.default_use_pass_direct
@@ -133,6 +203,45 @@ class Baker(Operator):
         bake_settings.cage_object              = self.default_cage_object
         # }
     
+    def split_pass_names(self, passes):
+        return SplitPassNames(passes)
+    
+    def find_pass_input(self, node, passes):
+        return FindPassInput(node, passes)
+    
+    def new_combine_node(self, nodes):
+        try:
+            return nodes.new(type = 'ShaderNodeCombineColor')
+        except RuntimeError:
+            return nodes.new(type = 'ShaderNodeCombineRGB') # Before 3.3
+    
+    def channels_to_rgb(self, node, src_socket, nodes, links, channels):
+        has_bsdf_inputs = False
+        for input in node.inputs:
+            if input.type == 'SHADER':
+                has_bsdf_inputs = True
+                if len(input.links):
+                    self.channels_to_rgb(input.links[0].from_node, input,
+                                    nodes, links, channels)
+        
+        if not has_bsdf_inputs:
+            emit = nodes.new(type = 'ShaderNodeEmission')
+            combine = self.new_combine_node(nodes)
+            links.new(combine.outputs[0], emit.inputs[0])
+            links.new(emit.outputs[0], src_socket)
+            for i, passes in enumerate(channels):
+                channel_input = combine.inputs[i]
+                channel_input.default_value = 0
+                pass_input = self.find_pass_input(node, passes)
+                if pass_input is None:
+                    continue
+                if len(pass_input.links):
+                    links.new(pass_input.links[0].from_socket, channel_input)
+                elif pass_input.type == 'VALUE':
+                    channel_input.default_value = pass_input.default_value
+                else:
+                    channel_input.default_value = pass_input.default_value[0]
+    
     def passes_to_rgb(self, node, src_socket, nodes, links, passes):
         has_bsdf_inputs = False
         for input in node.inputs:
@@ -146,14 +255,7 @@ class Baker(Operator):
             emit = nodes.new(type = 'ShaderNodeEmission')
             emit.inputs[0].default_value = 0, 0, 0, 0
             links.new(emit.outputs[0], src_socket)
-            ####### Find Pass Input Socket{
-            pass_input = None
-            for Pass in passes:
-                for tmp_input in node.inputs:
-                    if tmp_input.name.casefold() == Pass:
-                        pass_input = tmp_input
-                        break
-            ####### }
+            pass_input = self.find_pass_input(node, passes)
             if pass_input:
                 if len(pass_input.links):
                     links.new(pass_input.links[0].from_socket, emit.inputs[0])
@@ -174,18 +276,19 @@ class Baker(Operator):
                         emit.inputs[0].default_value[2] = pass_input.default_value
                         emit.inputs[0].default_value[3] = 1
     
-    def passes_to_emit_node(self, mat, passes):
+    def passes_to_emit_node(self, mat, passes, channels = None):
+        # channels: pass names for R, G and B instead of one pass
         nodes = mat.node_tree.nodes
         links = mat.node_tree.links
         
         out = self.find_node(nodes, 'OUTPUT_MATERIAL')
             
-        if out:
+        if out and channels:
+            channels = [self.split_pass_names(names) for names in channels]
+            self.channels_to_rgb(out, None, nodes, links, channels)
+        elif out:
         #### Modify Nodes
-            split_passes = passes.split(',')
-            for i in range(len(split_passes)):
-                split_passes[i] = split_passes[i].strip().casefold()
-            self.passes_to_rgb(out, None, nodes, links, split_passes)
+            self.passes_to_rgb(out, None, nodes, links, self.split_pass_names(passes))
         else:
         #### Create Default Texture Nodes
             out = nodes.new(type = 'ShaderNodeOutputMaterial')
@@ -193,27 +296,6 @@ class Baker(Operator):
             emit.inputs[0].default_value = 0, 0, 0, 0
             links.new(emit.outputs[0], out.inputs[0])
             
-    def copy_node(self, dst_nodes, node):
-        try:
-            new_node = dst_nodes.new(type = node.bl_idname)
-        except:
-            return None
-        for member in dir(node):
-            try:
-                value = getattr(node, member)
-                if value is None:
-                    continue
-                setattr(new_node, member, value)
-            except:
-                pass
-        for src_input in node.inputs:
-            dst_input = self.get_socket(new_node.inputs, src_input.identifier)
-            if dst_input is not None:
-                if hasattr(src_input, 'default_value') and \
-                        hasattr(dst_input, 'default_value'):
-                    dst_input.default_value = src_input.default_value
-        return new_node
-    
     def find_node(self, nodes, type):
         for node in nodes:
             if node.type == type:
@@ -224,104 +306,6 @@ class Baker(Operator):
                     return node
         return None
     
-    def get_socket(self, sockets, identifier):
-        for socket in sockets:
-            if socket.identifier == identifier:
-                return socket
-        return None
-    
-    def extract_nodes_rc(
-                self, gr_node, gr_in, gr_out,
-                nodes, links, n_group, node_dict):
-        if gr_node.name in node_dict:
-            return node_dict[gr_node.name]
-        
-        node = self.copy_node(nodes, gr_node)
-        node_dict[gr_node.name] = node
-        
-        if node is None:
-            return None
-        
-        ### Inputs {
-        for src_input in gr_node.inputs:
-            dst_input = self.get_socket(node.inputs, src_input.identifier)
-            if dst_input is None:
-                continue
-            for link in src_input.links:
-                from_node = link.from_node
-                
-                if from_node == gr_in:
-                    ng_input = self.get_socket(n_group.inputs, link.from_socket.identifier)
-                    if ng_input is None:
-                        continue
-                    dst_input.default_value = ng_input.default_value
-                    for ng_link in ng_input.links:
-                        links.new(ng_link.from_socket, dst_input)
-                else:
-                    link_node = self.extract_nodes_rc(
-                        from_node, gr_in, gr_out,
-                        nodes, links, n_group, node_dict)
-                    if link_node is not None:
-                        link_output = self.get_socket(link_node.outputs, link.from_socket.identifier)
-                        if link_output is not None:
-                            links.new(link_output, dst_input)
-        ### }
-        ### Outputs {
-        for src_output in gr_node.outputs:
-            dst_output = self.get_socket(node.outputs, src_output.identifier)
-            if dst_output is None:
-                continue
-            for link in src_output.links:
-                to_node = link.to_node
-                
-                if to_node == gr_out:
-                    ng_output = self.get_socket(n_group.outputs, link.to_socket.identifier)
-                    if ng_output is None:
-                        continue
-                    for ng_link in ng_output.links:
-                        links.new(dst_output, ng_link.to_socket)
-                else:
-                    link_node = self.extract_nodes_rc(
-                        to_node, gr_in, gr_out,
-                        nodes, links, n_group, node_dict)
-                    if link_node is not None:
-                        link_input = self.get_socket(link_node.inputs, link.to_socket.identifier)
-                        if link_input is not None:
-                            links.new(dst_output, link_input)
-        ### }
-        return node
-    
-    def ungroup_nodes(self, node_tree):
-        nodes = node_tree.nodes
-        links = node_tree.links
-        while True:
-            group_exists = False
-            ungroup_nodes = [n for n in nodes]
-            for node in ungroup_nodes:
-                if node.type != 'GROUP':
-                    continue
-                group_exists = True
-                
-                node_dict = {}
-                gr_nodes = node.node_tree.nodes
-                gr_in  = self.find_node(gr_nodes, 'GROUP_INPUT')
-                gr_out = self.find_node(gr_nodes, 'GROUP_OUTPUT')
-                if gr_in is None: continue
-                if gr_out is None: continue
-                
-                for gr_node in gr_nodes:
-                    if gr_node == gr_in:
-                        continue
-                    if gr_node == gr_out:
-                        continue
-                    self.extract_nodes_rc(
-                        gr_node, gr_in, gr_out,
-                        nodes, links, node, node_dict)
-                node_dict.clear()
-                nodes.remove(node)
-            if not group_exists:
-                break
-            
     def displacement_to_color(self, mat):
         nodes = mat.node_tree.nodes
         links = mat.node_tree.links
@@ -342,8 +326,15 @@ class Baker(Operator):
             links.new(from_socket, v_transform.inputs[0])
             links.new(v_transform.outputs[0], out.inputs[0])
     
+    def apply_cycles_profile(self, context, map):
+        cycles = context.scene.cycles
+        profile = CYCLES_PROFILES[MapProfile(map)]
+        for key, value in self.default_cycles_profile.items():
+            setattr(cycles, key, profile.get(key, value))
+    
     def init_bake_settings(self, context, map):
         context.scene.cycles.samples = map.samples
+        self.apply_cycles_profile(context, map)
         bake_settings = context.scene.render.bake
         bake_settings.normal_space             = map.normal_space
         
@@ -393,85 +384,82 @@ class Baker(Operator):
             bake_type = 'EMIT'
         return bake_type
     
-    def calc_surf_area(self, obj):
-        import bmesh
-        bm = bmesh.new(use_operators=False)
-        bm.from_mesh(obj.data)
-        bm.transform(obj.matrix_world)
-        bm.faces.ensure_lookup_table()
+    def PrepareImage(self, context, job):
+        props = context.scene.BakeLabProps
+        map = job.map
+        self.SetSaveImageSettings(context, map)
         
-        area = 0.0
-        for face in bm.faces:
-            area += face.calc_area()
-        return area
+        map.target_width  = job.width
+        map.target_height = job.height
+        map.final_aa      = job.aa
+        scale = 1 if job.tiles else job.bake_scale() # Tiles are supersampled one at a time
+        with self.tracer.Stage('allocate_image', map = map.name) as args:
+            bake_image = bpy.data.images.new(
+                name = job.image_name(),
+                width  = job.width  * scale, 
+                height = job.height * scale
+            )
+            bake_image.use_generated_float = map.float_depth
+            args.update(ImageArgs(bake_image))
+        self.SetColorSpace(bake_image, map)
+        
+        context.scene.render.bake.margin = props.bake_margin * job.bake_scale()
+        if props.save_or_pack == 'PACK':
+            if not self.free_buffers: # Packed once finished instead
+                with self.tracer.Stage('pack', **ImageArgs(bake_image)):
+                    bake_image.pack()
+        else:
+            bake_image.filepath = self.ImageFilePath(props, job, bake_image.name)
+            with self.tracer.Stage('save_render', **ImageArgs(bake_image)):
+                bake_image.save_render(bake_image.filepath)
+        
+        return bake_image
     
-    def round_to_power_of_2(self, num):
-        return pow(2,round(log2(num)))
+    def ImageFilePath(self, props, job, image_name):
+        extension = ImageExtension(job.map)
+        
+        abs_save_path = bpy.path.abspath(props.save_path)
+        if not os.path.isdir(abs_save_path):
+            os.makedirs(abs_save_path, 0o777)
+        
+        if props.create_folder:
+            if props.bake_mode == "ALL_TO_ONE":
+                return abspath(join(abs_save_path, props.folder_name, image_name + extension))
+            return abspath(join(abs_save_path, job.name, image_name + extension))
+        return abspath(join(abs_save_path, image_name + extension))
     
-    def PrepareImage(self, context, map, objs, name):
+    def LoadCachedImage(self, context, job):
         props = context.scene.BakeLabProps
-        self.SetSaveImageSettings(context, map)
-        
-        if props.image_size == 'FIXED':
-            map.target_width  = map.width
-            map.target_height = map.height
-        elif props.image_size == 'ADAPTIVE':
-            area = 0
-            for obj in objs:
-                area += self.calc_surf_area(obj)
-            size = pow(area, 0.5) * props.texel_per_unit
-            if props.round_adaptive_image:
-                size = self.round_to_power_of_2(size)
-            map.target_width  = size
-            map.target_height = size
-            
-        map.final_aa = props.anti_alias
-        if map.aa_override > 0:
-            map.final_aa = map.aa_override
-        bake_image = bpy.data.images.new(
-            name = map.img_name.replace('*', name),
-            width  = map.target_width  * map.final_aa, 
-            height = map.target_height * map.final_aa
-        )
-        bake_image.use_generated_float = map.float_depth
+        filepath = job.cache_path
+        try:
+            if props.save_or_pack == 'SAVE':
+                filepath = self.ImageFilePath(props, job, job.image_name())
+                os.makedirs(os.path.dirname(filepath), exist_ok = True)
+                shutil.copyfile(job.cache_path, filepath)
+            image = bpy.data.images.load(filepath, check_existing = False)
+        except (OSError, RuntimeError):
+            return False # Evicted or unreadable, bake it instead
+        image.name = job.image_name()
+        self.SetColorSpace(image, job.map)
+        TagImage(image, job)
+        if job.crop is not None:
+            image[CROP_KEY] = job.crop
+        if props.save_or_pack == 'PACK':
+            image.pack()
+        job.image = image
+        return True
+    
+    def SetColorSpace(self, image, map):
         try:
-            bake_image.colorspace_settings.name = map.color_space
+            image.colorspace_settings.name = map.color_space
         except:
             try:
                 if map.color_space == 'sRGB':
-                    bake_image.colorspace_settings.name = 'sRGB EOTF'
+                    image.colorspace_settings.name = 'sRGB EOTF'
                 elif map.color_space == 'Non-Color':
-                    bake_image.colorspace_settings.name = 'Non-Colour Data'
+                    image.colorspace_settings.name = 'Non-Colour Data'
             except:
                 self.report(type = {'WARNING'}, message = "Couldn't change color space of image")
-        
-        context.scene.render.bake.margin = props.bake_margin * map.final_aa
-        if props.save_or_pack == 'PACK':
-            bake_image.pack()
-        else:
-            extension = "."
-            if map.file_format == 'PNG':
-                extension = '.png'
-            if map.file_format == 'JPEG':
-                extension = '.jpg'
-            if map.file_format == 'OPEN_EXR':
-                extension = '.exr'
-            
-            abs_save_path = bpy.path.abspath(props.save_path)
-            if not os.path.isdir(abs_save_path):
-                os.makedirs(abs_save_path, 0o777)
-            
-            if props.create_folder:
-                if props.bake_mode == "ALL_TO_ONE":
-                    bake_image.filepath = abspath(join(abs_save_path, props.folder_name, bake_image.name + extension))
-                else:
-                    bake_image.filepath = abspath(join(abs_save_path, name, bake_image.name + extension))
-            else:
-                bake_image.filepath = abspath(join(abs_save_path, bake_image.name + extension))
-            
-            bake_image.save_render(bake_image.filepath)
-        
-        return bake_image
     
     def SetSaveImageSettings(self, context, map):
         img_settings = context.scene.render.image_settings
@@ -493,74 +481,159 @@ class Baker(Operator):
                 img_settings.exr_codec    = map.exr_codec_16
     
     def ReserveMaterials(self, obj):
-        selected_objects = bpy.context.selected_objects
-        active_object    = bpy.context.active_object
-        
-        SelectObject(obj)
         if len(obj.material_slots) == 0:
-            bpy.ops.object.material_slot_add()
+            AddMaterialSlot(obj)
         for slot in obj.material_slots:
+            if slot.link == 'DATA' and obj.data in self.reserved_datas:
+                continue # Already reserved through a linked duplicate
             self.object_slots.append(slot)
             self.original_materials.append(slot.material)
-            if slot.material is not None:
-                slot.material = slot.material.copy()
-        
-        SelectObjects(active_object,selected_objects)
+        self.reserved_datas.add(obj.data)
         
         return (self.object_slots, self.original_materials)
     
     def RestoreMaterials(self):
+        # Staged materials stay alive for the next bakes, they are removed once in finish
         for i in range(0, min(len(self.object_slots), len(self.original_materials))):
             if self.object_slots[i] is not None:
-                if self.object_slots[i].material is not None:
-                    bpy.data.materials.remove(self.object_slots[i].material)
                 self.object_slots[i].material = self.original_materials[i]
         self.object_slots.clear()
         self.original_materials.clear()
+        self.reserved_datas.clear()
+        self.staged_images.clear()
+    
+    def MaterialTransform(self, map, channel_maps = None):
+        # What PrepareMaterials does to a source material for this map, None = used as is
+        if map.type == 'CustomPass' and channel_maps:
+            return (
+                'Channels',
+                tuple(m.pass_name for m in channel_maps),
+                any(m.deep_search for m in channel_maps)
+            )
+        if map.type == 'CustomPass':
+            return ('CustomPass', (map.pass_name,), map.deep_search)
+        if map.type == 'Albedo':
+            return ('Albedo', ('Albedo,Color,Base Color,Col,Paint Color',), True)
+        if map.type == 'Displacement':
+            return ('Displacement', (), False)
+        return None
+    
+    def build_staged_material(self, mat, transform):
+        if mat is None:
+            staged = self.GetEmptyMaterial()
+        else:
+            staged = mat.copy()
+        staged.use_nodes = True
+        if transform is None:
+            return staged
+        
+        kind, passes, deep_search = transform
+        if deep_search:
+            with self.tracer.Stage('flatten_groups', material = staged.name):
+                self.flattener.Flatten(staged.node_tree)
+        if kind == 'Channels':
+            self.passes_to_emit_node(staged, None, list(passes))
+        elif kind == 'Displacement':
+            self.displacement_to_color(staged)
+        else:
+            self.passes_to_emit_node(staged, passes[0])
+        return staged
+    
+    def StageMaterial(self, mat, transform, bake_image = None):
+        # Each transformed copy is built once and shared by every slot and map that needs it,
+        # only slots baking into different images in the same cycles call need separate copies
+        mat = self.staged_sources.get(mat, (mat, None))[0]
+        variant = 0
+        while True:
+            key = (mat, transform, variant)
+            staged = self.staged_materials.get(key)
+            if staged is None:
+                staged = self.build_staged_material(mat, transform)
+                self.staged_materials[key] = staged
+                self.staged_sources[staged] = key
+            if bake_image is None or self.staged_images.get(staged, bake_image) is bake_image:
+                break
+            variant += 1
+        
+        if bake_image is not None:
+            self.staged_images[staged] = bake_image
+            nodes = staged.node_tree.nodes
+            if self.TMP_IMAGE_NODE_NAME in nodes:
+                img_node = nodes[self.TMP_IMAGE_NODE_NAME]
+            else:
+                img_node = nodes.new(type = 'ShaderNodeTexImage')
+                img_node.name = self.TMP_IMAGE_NODE_NAME
+            nodes.active = img_node
+            img_node.image = bake_image
+        return staged
+    
+    def RemoveStagedMaterials(self):
+        for staged in self.staged_materials.values():
+            bpy.data.materials.remove(staged)
+        self.staged_materials.clear()
+        self.staged_sources.clear()
+        self.staged_images.clear()
+    
+    def bake_job_running(self):
+        # A cancelled modal can leave cycles baking into the staged materials
+        if hasattr(bpy.app, 'is_job_running'): # 3.3+
+            return bpy.app.is_job_running('OBJECT_BAKE')
+        return self._bake_handlers is not None and self.bake_status is None
     
-    def PrepareMaterials(self, context, dst_obj, src_obj_list, map, bake_image):
-        active_obj = context.active_object
-        selected_objects = context.selected_objects
+    def DeferMaterialCleanup(self):
+        # Slots are restored and staged materials removed once the cycles job ended,
+        # the operator is gone by then so everything needed is kept here
+        object_slots = list(self.object_slots)
+        original_materials = list(self.original_materials)
+        staged_materials = list(self.staged_materials.values())
+        self.object_slots.clear()
+        self.original_materials.clear()
+        self.reserved_datas.clear()
+        self.staged_materials.clear()
+        self.staged_sources.clear()
+        self.staged_images.clear()
+        
+        handlers = bpy.app.handlers
+        ended = []
+        def bake_ended(*args):
+            ended.append(True)
+        use_handlers = not hasattr(bpy.app, 'is_job_running')
+        if use_handlers:
+            handlers.object_bake_complete.append(bake_ended)
+            handlers.object_bake_cancel.append(bake_ended)
         
+        def cleanup():
+            if use_handlers:
+                if not ended:
+                    return 0.1
+                handlers.object_bake_complete.remove(bake_ended)
+                handlers.object_bake_cancel.remove(bake_ended)
+            elif bpy.app.is_job_running('OBJECT_BAKE'):
+                return 0.1
+            for slot, mat in zip(object_slots, original_materials):
+                if slot is not None:
+                    slot.material = mat
+            for staged in staged_materials:
+                bpy.data.materials.remove(staged)
+            return None
+        bpy.app.timers.register(cleanup, first_interval = 0.1)
+    
+    def PrepareMaterials(self, context, dst_obj, src_obj_list, map, bake_image, channel_maps = None):
+        transform = self.MaterialTransform(map, channel_maps)
         for obj in src_obj_list:
-            SelectObject(obj)
             if len(obj.material_slots) == 0:
-                bpy.ops.object.material_slot_add()
+                AddMaterialSlot(obj)
+            image = bake_image if obj is dst_obj else None
             for slot in obj.material_slots:
-                if slot.material is None:
-                    slot.material = self.GetEmptyMaterial()
-                mat = slot.material
-                mat.use_nodes = True
-                
-                if map.type == 'CustomPass':
-                    if map.deep_search:
-                        self.ungroup_nodes(mat.node_tree)
-                    self.passes_to_emit_node(mat, map.pass_name)
-                if map.type == 'Albedo':
-                    self.ungroup_nodes(mat.node_tree)
-                    self.passes_to_emit_node(mat, 'Albedo,Color,Base Color,Col,Paint Color')
-                if map.type == 'Displacement':
-                    self.displacement_to_color(mat)
+                slot.material = self.StageMaterial(slot.material, transform, image)
                     
         ###################
         
-        SelectObject(dst_obj)
-        if len(dst_obj.material_slots) == 0:
-            bpy.ops.object.material_slot_add()
-        for slot in dst_obj.material_slots:
-            if slot.material is None:
-                slot.material = self.GetEmptyMaterial()
-            mat = slot.material
-            mat.use_nodes = True
-            if self.TMP_IMAGE_NODE_NAME in mat.node_tree.nodes:
-                img_node = mat.node_tree.nodes[self.TMP_IMAGE_NODE_NAME]
-            else:
-                img_node = mat.node_tree.nodes.new(type = 'ShaderNodeTexImage')
-                img_node.name = self.TMP_IMAGE_NODE_NAME
-            mat.node_tree.nodes.active = img_node
-            img_node.image = bake_image
-            
-        SelectObjects(active_obj, selected_objects)
+        if dst_obj not in src_obj_list:
+            if len(dst_obj.material_slots) == 0:
+                AddMaterialSlot(dst_obj)
+            for slot in dst_obj.material_slots:
+                slot.material = self.StageMaterial(slot.material, None, bake_image)
             
     def GetEmptyMaterial(self):
         mat = bpy.data.materials.new(self.TMP_EMPTY_MAT_NAME)
@@ -569,66 +642,868 @@ class Baker(Operator):
         img_node.name = self.TMP_IMAGE_NODE_NAME
         return mat
     
+    def use_render_modifiers(self, object_list):
+        # Evaluate modifiers as they render, the viewport may show fewer or simpler ones
+        saved = []
+        for obj in object_list:
+            for modifier in obj.modifiers:
+                if modifier.show_viewport != modifier.show_render:
+                    saved.append((modifier, 'show_viewport', modifier.show_viewport))
+                    modifier.show_viewport = modifier.show_render
+                if modifier.type == 'SUBSURF' and modifier.levels != modifier.render_levels:
+                    saved.append((modifier, 'levels', modifier.levels))
+                    modifier.levels = modifier.render_levels
+        return saved
+    
+    def restore_modifiers(self, saved):
+        for modifier, attribute, value in reversed(saved):
+            setattr(modifier, attribute, value)
+    
     def create_merged_object(self, context, object_list):
-        ##### Create New Object{
-        merged_mesh = bpy.data.meshes.new('BAKELAB_MERGED_MESH_TMP')
-        merged_obj  = bpy.data.objects.new('BAKELAB_MERGED_OBJ_TMP', merged_mesh)
-        merged_obj.location = 0, 0, 0
-        context.scene.collection.objects.link(merged_obj)
-        merged_mesh.update()
-        ##### }
+        # The merged mesh is kept after the bake and reused while its inputs don't change
+        saved = self.use_render_modifiers(object_list)
+        try:
+            depsgraph = context.evaluated_depsgraph_get()
+            key = MergedMeshHash(object_list, depsgraph)
+            merged_mesh = bpy.data.meshes.get(self.TMP_MERGED_MESH_NAME)
+            if merged_mesh is None or merged_mesh.get(HASH_KEY) != key:
+                merged_mesh = self.build_merged_mesh(object_list, depsgraph, merged_mesh)
+                merged_mesh[HASH_KEY] = key
+        finally:
+            self.restore_modifiers(saved)
         
+        merged_obj = bpy.data.objects.new('BAKELAB_MERGED_OBJ_TMP', merged_mesh)
+        context.scene.collection.objects.link(merged_obj)
+        return merged_obj
+    
+    def build_merged_mesh(self, object_list, depsgraph, merged_mesh = None):
+        # World space copies of the evaluated meshes, read and written in bulk.
+        # Corner normals are always copied as custom normals, rebuilt edges would lose
+        # auto smooth, sharp edges and sharp faces and change the bake rays and tangents
+        coords, vertex_indices, loop_starts, loop_totals = [], [], [], []
+        smooth, uvs, normals = [], [], []
+        vertex_offset = 0
+        loop_offset = 0
         for obj in object_list:
-            SelectObject(obj)
-            bpy.ops.object.duplicate(linked=False, mode='TRANSLATION')
-            obj_clone = context.active_object
+            obj_eval = obj.evaluated_get(depsgraph)
+            mesh = obj_eval.to_mesh()
+            vertex_count  = len(mesh.vertices)
+            loop_count    = len(mesh.loops)
+            polygon_count = len(mesh.polygons)
             
-            #### Apply modifiers{
-            for modifier in obj_clone.modifiers:
-                if modifier.show_render:
-                    if modifier.type == 'SUBSURF':
-                        modifier.levels = modifier.render_levels
-                    bpy.ops.object.modifier_apply(modifier = modifier.name)
-            ##### }
+            matrix = np.array(obj_eval.matrix_world, dtype = np.float64)
+            co = np.empty(vertex_count * 3, dtype = np.float32)
+            mesh.vertices.foreach_get('co', co)
+            coords.append(co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3])
             
-            #### Merge{
-            SelectObject(merged_obj)
-            obj_clone.select_set(True)
+            indices = np.empty(loop_count, dtype = np.int32)
+            starts  = np.empty(polygon_count, dtype = np.int32)
+            totals  = np.empty(polygon_count, dtype = np.int32)
+            flags   = np.empty(polygon_count, dtype = bool)
+            uv      = np.zeros(loop_count * 2, dtype = np.float32)
+            mesh.loops.foreach_get('vertex_index', indices)
+            mesh.polygons.foreach_get('loop_start', starts)
+            mesh.polygons.foreach_get('loop_total', totals)
+            mesh.polygons.foreach_get('use_smooth', flags)
+            uv_layer = RenderUVLayer(mesh)
+            if uv_layer is not None:
+                uv_layer.data.foreach_get('uv', uv)
+            uv = uv.reshape(-1, 2)
+            normal = CornerNormals(mesh).reshape(-1, 3) @ np.linalg.inv(matrix[:3, :3])
+            normal /= np.maximum(np.linalg.norm(normal, axis = 1), 1e-8)[:, None]
             
-            clone_data = obj_clone.data
-            bpy.ops.object.join()
-            bpy.data.meshes.remove(clone_data)
-            #### }
-        
-        while len(merged_obj.material_slots)>0:
-            bpy.ops.object.material_slot_remove()
-        merged_mesh.update()
-        return merged_obj
+            if np.linalg.det(matrix[:3, :3]) < 0:
+                # Mirrored, reverse the winding so faces keep pointing out
+                polygon_of_loop = np.repeat(np.arange(polygon_count), totals)
+                corner = np.arange(loop_count) - starts[polygon_of_loop]
+                corner = np.where(corner == 0, 0, totals[polygon_of_loop] - corner)
+                order = starts[polygon_of_loop] + corner
+                indices = indices[order]
+                uv = uv[order]
+                normal = normal[order]
+            
+            vertex_indices.append(indices + vertex_offset)
+            loop_starts.append(starts + loop_offset)
+            loop_totals.append(totals)
+            smooth.append(flags)
+            uvs.append(uv)
+            normals.append(normal)
+            vertex_offset += vertex_count
+            loop_offset += loop_count
+            obj_eval.to_mesh_clear()
+        
+        if merged_mesh is None:
+            merged_mesh = bpy.data.meshes.new(self.TMP_MERGED_MESH_NAME)
+        else:
+            merged_mesh.clear_geometry()
+            while merged_mesh.uv_layers:
+                merged_mesh.uv_layers.remove(merged_mesh.uv_layers[0])
+        
+        coords = np.concatenate(coords).astype(np.float32)
+        loop_starts = np.concatenate(loop_starts)
+        merged_mesh.vertices.add(len(coords))
+        merged_mesh.vertices.foreach_set('co', coords.ravel())
+        merged_mesh.loops.add(loop_offset)
+        merged_mesh.loops.foreach_set('vertex_index', np.concatenate(vertex_indices))
+        merged_mesh.polygons.add(len(loop_starts))
+        merged_mesh.polygons.foreach_set('loop_start', loop_starts)
+        if not merged_mesh.polygons.bl_rna.properties['loop_total'].is_readonly: # Sizes follow the starts in 3.6+
+            merged_mesh.polygons.foreach_set('loop_total', np.concatenate(loop_totals))
+        merged_mesh.polygons.foreach_set('use_smooth', np.concatenate(smooth))
+        uv_layer = merged_mesh.uv_layers.new(name = 'UVMap')
+        uv_layer.data.foreach_set('uv', np.concatenate(uvs).ravel())
+        merged_mesh.update(calc_edges = True)
+        
+        if hasattr(merged_mesh, 'use_auto_smooth'): # Before 4.1 custom normals need auto smooth
+            merged_mesh.use_auto_smooth = True
+        merged_mesh.normals_split_custom_set(np.concatenate(normals).astype(np.float32))
+        return merged_mesh
+    
+    def ConstantColor(self, objs):
+        # Color emitted by every material of objs, None unless all are the same unlinked emission
+        color = None
+        for obj in objs:
+            for slot in obj.material_slots:
+                mat = slot.material
+                if mat is None or not mat.use_nodes:
+                    return None
+                out = self.find_node(mat.node_tree.nodes, 'OUTPUT_MATERIAL')
+                if out is None or len(out.inputs[0].links) == 0:
+                    return None
+                link = out.inputs[0].links[0]
+                emit = link.from_node
+                if link.is_muted or emit.type != 'EMISSION' or emit.inputs[1].is_linked:
+                    return None
+                strength = emit.inputs[1].default_value
+                if emit.inputs[0].is_linked:
+                    # Packed scalar passes
+                    combine = emit.inputs[0].links[0].from_node
+                    if combine.type not in {'COMBINE_COLOR', 'COMBRGB'}:
+                        return None
+                    if any(input.is_linked for input in combine.inputs[:3]):
+                        return None
+                    value = tuple(input.default_value * strength for input in combine.inputs[:3])
+                else:
+                    value = tuple(c * strength for c in emit.inputs[0].default_value[:3])
+                if color is None:
+                    color = value
+                elif max(abs(a - b) for a, b in zip(color, value)) > 1e-6:
+                    return None
+        return color
     
-    def down_scale(self, img, props, map):
-        if map.final_aa == 1:
+    def FillConstant(self, job, color):
+        if job.channels:
+            for i, channel in enumerate(job.channels):
+                if not self.FillConstant(channel, (color[i],) * 3):
+                    return False
+            return True
+        image = job.image
+        encoding = self.pixel_encoding(image)
+        if encoding is None:
+            return False
+        pixel = np.array(color, dtype = np.float32)
+        if encoding == 'SRGB':
+            pixel = self.linear_to_srgb(pixel)
+        
+        image.scale(job.width, job.height)
+        pixels = np.ones((job.width * job.height, 4), dtype = np.float32)
+        pixels[:, :3] = pixel
+        image.pixels.foreach_set(pixels.ravel())
+        image[CONSTANT_KEY] = color
+        job.constant = color
+        return True
+    
+    def pixel_encoding(self, image):
+        # Float and data pixels are linear, byte pixels are stored in the image color space
+        if image.is_float or image.colorspace_settings.is_data:
+            return 'LINEAR'
+        if image.colorspace_settings.name.startswith('sRGB'):
+            return 'SRGB'
+        return None
+    
+    def linear_to_srgb(self, values):
+        values = np.clip(values, 0.0, 1.0)
+        return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.power(values, 1 / 2.4) - 0.055)
+    
+    def GuideImage(self, context, job, type, width, height):
+        # Copy of a map baked earlier for the same objects, scaled to the bake size
+        for mapData in context.scene.BakeLab_Data[job.data].map_list:
+            if mapData.bake_map.type != type or mapData.image is None:
+                continue
+            guide = mapData.image.copy()
+            guide.scale(width, height)
+            if type == 'Normal':
+                # The denoiser expects -1..1 normals
+                pixels = np.empty(width * height * 4, dtype = np.float32)
+                guide.pixels.foreach_get(pixels)
+                bpy.data.images.remove(guide)
+                pixels = pixels.reshape(-1, 4)
+                pixels[:, :3] = pixels[:, :3] * 2 - 1
+                guide = bpy.data.images.new(
+                    name = self.TMP_DENOISE_SCENE_NAME + '_NORMAL',
+                    width = width, height = height, float_buffer = True
+                )
+                guide.colorspace_settings.is_data = True
+                guide.pixels.foreach_set(pixels.ravel())
+            return guide
+        return None
+    
+    def Denoise(self, context, job):
+        image = job.image
+        encoding = self.pixel_encoding(image)
+        if encoding is None:
+            self.report(type = {'WARNING'}, message = "Can't denoise " + image.name + ", unknown color space")
+            return
+        width, height = image.size
+        filepath = join(tempfile.gettempdir(), 'bakelab_denoise_' + str(os.getpid()) + '.exr')
+        guides = {}
+        scene = bpy.data.scenes.new(self.TMP_DENOISE_SCENE_NAME)
+        try:
+            # Compositor only scene: image -> denoise -> composite, written as linear EXR {
+            scene.render.resolution_x = width
+            scene.render.resolution_y = height
+            scene.render.resolution_percentage = 100
+            scene.render.use_compositing = True
+            scene.render.use_sequencer = False
+            scene.render.use_file_extension = False
+            scene.render.filepath = filepath
+            scene.render.image_settings.file_format = 'OPEN_EXR'
+            scene.render.image_settings.color_mode  = 'RGBA'
+            scene.render.image_settings.color_depth = '32'
+            scene.view_settings.view_transform = 'Standard'
+            scene.view_settings.look = 'None'
+            scene.view_settings.exposure = 0
+            scene.view_settings.gamma = 1
+            
+            scene.use_nodes = True
+            nodes = scene.node_tree.nodes
+            links = scene.node_tree.links
+            nodes.clear()
+            img_node = nodes.new(type = 'CompositorNodeImage')
+            img_node.image = image
+            denoise = nodes.new(type = 'CompositorNodeDenoise')
+            out = nodes.new(type = 'CompositorNodeComposite')
+            links.new(img_node.outputs['Image'], denoise.inputs['Image'])
+            links.new(denoise.outputs['Image'], out.inputs['Image'])
+            for type in ('Albedo', 'Normal'):
+                guides[type] = self.GuideImage(context, job, type, width, height)
+                if guides[type] is not None:
+                    guide_node = nodes.new(type = 'CompositorNodeImage')
+                    guide_node.image = guides[type]
+                    links.new(guide_node.outputs['Image'], denoise.inputs[type])
+            # }
+            
+            bpy.ops.render.render(scene = scene.name, write_still = True)
+            
+            result = bpy.data.images.load(filepath, check_existing = False)
+            pixels = np.empty(width * height * 4, dtype = np.float32)
+            result.pixels.foreach_get(pixels)
+            bpy.data.images.remove(result)
+            if encoding == 'SRGB':
+                pixels = pixels.reshape(-1, 4)
+                pixels[:, :3] = self.linear_to_srgb(pixels[:, :3])
+            image.pixels.foreach_set(pixels.ravel())
+        except (RuntimeError, KeyError) as error:
+            self.report(type = {'WARNING'}, message = "Couldn't denoise " + image.name + ': ' + str(error))
+        finally:
+            bpy.data.scenes.remove(scene)
+            for guide in guides.values():
+                if guide is not None:
+                    bpy.data.images.remove(guide)
+            if exists(filepath):
+                os.remove(filepath)
+    
+    def SplitChannels(self, job):
+        # Each channel image gets its channel of the packed bake as grey
+        width, height = job.image.size
+        pixels = np.empty(width * height * 4, dtype = np.float32)
+        job.image.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(-1, 4)
+        channel_pixels = np.ones_like(pixels)
+        for i, channel in enumerate(job.channels):
+            channel_pixels[:, :3] = pixels[:, i:i + 1]
+            channel.image.pixels.foreach_set(channel_pixels.ravel())
+    
+    def down_scale(self, img, job):
+        if job.aa == 1 or tuple(img.size) == (job.width, job.height):
+            return
+        img.scale(job.width, job.height)
+    
+    def FinishImage(self, context, job):
+        props = context.scene.BakeLabProps
+        if job.map.denoise and job.map.type in DENOISE_MAPS and job.constant is None:
+            with self.tracer.Stage('denoise', map = job.map.name, **ImageArgs(job.image)):
+                self.Denoise(context, job) # Before down scaling, while noise is per pixel
+        self.SetSaveImageSettings(context, job.map)
+        if job.hash is not None:
+            TagImage(job.image, job)
+        if job.crop is not None:
+            job.image[CROP_KEY] = job.crop
+        with self.tracer.Stage('down_scale', map = job.map.name, **ImageArgs(job.image)) as args:
+            self.down_scale(job.image, job)
+            args['scaled_to'] = list(job.image.size)
+        if props.save_or_pack == 'PACK':
+            with self.tracer.Stage('pack', map = job.map.name, **ImageArgs(job.image)):
+                job.image.pack()
+        else:
+            with self.tracer.Stage('save_render', map = job.map.name, **ImageArgs(job.image)):
+                job.image.save_render(job.image.filepath)
+        if self.bake_cache is not None and job.hash is not None and IsCacheable(job.map):
+            with self.tracer.Stage('cache_store', map = job.map.name, image = job.image.name):
+                self.bake_cache.Store(job.hash, ImageExtension(job.map), job.image)
+        if self.free_buffers and job.image.packed_file is not None and job.image.source == 'FILE':
+            job.image.buffers_free() # Reloaded from the packed data when used
+    
+    def add_bake_handlers(self):
+        handlers = bpy.app.handlers
+        if not hasattr(handlers, 'object_bake_complete'):
+            self._bake_handlers = None
+            return
+        
+        def bake_complete(*args):
+            self.bake_status = 'FINISHED'
+        def bake_cancel(*args):
+            self.bake_status = 'CANCELLED'
+        
+        handlers.object_bake_complete.append(bake_complete)
+        handlers.object_bake_cancel.append(bake_cancel)
+        self._bake_handlers = (bake_complete, bake_cancel)
+    
+    def remove_bake_handlers(self):
+        if self._bake_handlers is None:
+            return
+        bake_complete, bake_cancel = self._bake_handlers
+        handlers = bpy.app.handlers
+        if bake_complete in handlers.object_bake_complete:
+            handlers.object_bake_complete.remove(bake_complete)
+        if bake_cancel in handlers.object_bake_cancel:
+            handlers.object_bake_cancel.remove(bake_cancel)
+        self._bake_handlers = None
+    
+    def bake_operator(self, context, execution, bake_type):
+        # Called per step, an override must not stay active across the generator's yields.
+        # None when cycles reports an error, bpy.ops raises instead of returning it
+        try:
+            with ObjectContext(context, *self.bake_objects):
+                return bpy.ops.object.bake(execution, type = bake_type)
+        except RuntimeError as error:
+            self.report(type = {'ERROR'}, message = 'Baking failed: ' + str(error).strip())
+            return None
+    
+    def BakeImage(self, context, bake_type, bake_image):
+        # Only cycles time goes into the bake history, not material and image setup
+        start_time = time.perf_counter()
+        yield from self.bake_and_wait(context, bake_type, bake_image)
+        self.bake_seconds += time.perf_counter() - start_time
+    
+    def bake_and_wait(self, context, bake_type, bake_image):
+        if self.synchronous:
+            result = self.bake_operator(context, 'EXEC_DEFAULT', bake_type)
+            if result is None:
+                yield -1
+            elif result != {'FINISHED'}:
+                self.report(type = {'ERROR'}, message = 'Baking failed')
+                yield -1
             return
-        img.scale(map.target_width, map.target_height)
+        
+        # Yields 2 while waiting on cycles, the modal stops stepping until the next tick
+        while True:
+            result = self.bake_operator(context, 'INVOKE_DEFAULT', bake_type)
+            if result is None:
+                yield -1
+            if result == {'RUNNING_MODAL'}:
+                self.bake_status = None # Set by the handlers once the job ends
+                break
+            yield 2
+        
+        if self._bake_handlers is None:
+            # No bake handlers in this blender version, poll the image instead
+            while not bake_image.is_dirty:
+                yield 2
+            return
+        
+        while self.bake_status is None:
+            yield 2
+        if self.bake_status == 'CANCELLED':
+            self.report(type = {'WARNING'}, message = 'Baking cancelled')
+            yield -1
+    
+    def BakeSamples(self, context, bake_type, map, images):
+        # Without bake handlers there is no way to tell when a later step finished
+        if map.progressive and (self.synchronous or self._bake_handlers is not None):
+            yield from self.BakeProgressive(context, bake_type, map, images)
+        else:
+            yield from self.BakeImage(context, bake_type, images[0])
+            self.pass_samples.append(context.scene.cycles.samples)
     
-    def UpdateDisplayStatus(self, props, obj, map, image):
+    def BakeProgressive(self, context, bake_type, map, images):
+        # Bakes in steps with new seeds and averages them until the noise is low enough
+        scene = context.scene
+        props = scene.BakeLabProps
+        max_samples = scene.cycles.samples # Budget BakeJobs set for the batch
+        seed = scene.cycles.seed
+        step = min(map.progressive_step, max_samples)
+        if step * 2 > max_samples: # The noise check needs two passes within the budget
+            step = max(1, max_samples // 2)
+        steps = -(-max_samples // step)
+        size_text = props.baking_map_size
+        
+        accumulators = [PixelAccumulator(image) for image in images]
+        start_time = time.perf_counter()
+        baked_steps = 0
+        # Restored for the next tile or jitter pass, each one gets the whole budget
+        try:
+            scene.cycles.samples = step
+            for i in range(steps):
+                scene.cycles.seed = self.default_seed + i
+                yield from self.BakeImage(context, bake_type, images[0])
+                for accumulator in accumulators:
+                    accumulator.Add()
+                baked_steps += 1
+                props.baking_map_size = size_text + ' ' + str((i + 1) * step) + ' samples'
+                
+                if map.time_limit > 0 and time.perf_counter() - start_time > map.time_limit:
+                    break
+                if all(accumulator.Converged(map.noise_threshold) for accumulator in accumulators):
+                    break
+        finally:
+            scene.cycles.samples = max_samples
+            scene.cycles.seed = seed
+        self.pass_samples.append(baked_steps * step)
+        
+        for accumulator in accumulators:
+            accumulator.Write()
+    
+    def SetBakeImage(self, objs, image):
+        for obj in objs:
+            for slot in obj.material_slots:
+                mat = slot.material
+                if mat is not None and mat.use_nodes and self.TMP_IMAGE_NODE_NAME in mat.node_tree.nodes:
+                    mat.node_tree.nodes[self.TMP_IMAGE_NODE_NAME].image = image
+    
+    def jitter_offsets(self, job):
+        # Sub-texel shifts of an aa x aa grid, one bake pass each
+        if not job.accumulate:
+            return [(0.0, 0.0)]
+        steps = [(i + 0.5) / job.aa - 0.5 for i in range(job.aa)]
+        return [(x, y) for y in steps for x in steps]
+    
+    def AddTileUVLayers(self, jobs):
+        # Temporary active UV map per mesh, textures keep reading the render UV map
+        layers = []
+        for job in jobs:
+            for obj in job.targets:
+                mesh = obj.data
+                if any(layer[0] == mesh for layer in layers):
+                    continue
+                crop_offset, crop_size = job.uv_rect()
+                texel = crop_size / np.array((job.width, job.height), dtype = np.float32)
+                layers.append(self.add_tile_uv_layer(mesh, texel, crop_offset, crop_size))
+        return layers
+    
+    def add_tile_uv_layer(self, mesh, texel, crop_offset, crop_size):
+        uv_layer = mesh.uv_layers.active
+        uvs = np.empty(len(uv_layer.data) * 2, dtype = np.float32)
+        uv_layer.data.foreach_get('uv', uvs)
+        active_index = mesh.uv_layers.active_index
+        mesh.uv_layers.active = mesh.uv_layers.new(name = self.TMP_UV_NAME, do_init = False)
+        
+        loop_starts = np.empty(len(mesh.polygons), dtype = np.int32)
+        mesh.polygons.foreach_get('loop_start', loop_starts)
+        return (mesh, uvs.reshape(-1, 2), np.sort(loop_starts), active_index, texel, crop_offset, crop_size)
+    
+    def RemoveTileUVLayers(self, layers):
+        for mesh, uvs, loop_starts, active_index, texel, crop_offset, crop_size in layers:
+            if self.TMP_UV_NAME in mesh.uv_layers:
+                mesh.uv_layers.remove(mesh.uv_layers[self.TMP_UV_NAME])
+            mesh.uv_layers.active_index = active_index
+    
+    def MapTileUVs(self, layers, offset, scale, jitter = (0.0, 0.0)):
+        # Maps the tile to 0..1 shifted by jitter texels, returns False if no face reaches into it
+        # offset and scale are relative to the image, which covers the crop of each layer
+        in_tile = False
+        for mesh, uvs, loop_starts, active_index, texel, crop_offset, crop_size in layers:
+            tile_offset = crop_offset + offset * crop_size
+            tile_uvs = (uvs - tile_offset - np.array(jitter, dtype = np.float32) * texel) / (scale * crop_size)
+            mesh.uv_layers[self.TMP_UV_NAME].data.foreach_set('uv', tile_uvs.ravel())
+            mesh.update()
+            if not in_tile and len(loop_starts):
+                low  = np.minimum.reduceat(tile_uvs, loop_starts, axis = 0)
+                high = np.maximum.reduceat(tile_uvs, loop_starts, axis = 0)
+                in_tile = bool(np.any((low < 1).all(axis = 1) & (high > 0).all(axis = 1)))
+        return in_tile
+    
+    def BakeTiles(self, context, bake_type, job):
+        # Bakes one supersampled tile at a time and gathers the down scaled tiles
+        props = context.scene.BakeLabProps
+        width, height = job.width, job.height
+        tile_scale = job.bake_scale()
+        columns, rows = job.tiles
+        size_text = props.baking_map_size
+        
+        pixels = np.empty(width * height * 4, dtype = np.float32)
+        job.image.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(height, width, 4)
+        
+        layers = self.AddTileUVLayers([job])
+        tile = None
+        try:
+            for row in range(rows):
+                for column in range(columns):
+                    x0, x1 = width  * column // columns, width  * (column + 1) // columns
+                    y0, y1 = height * row    // rows,    height * (row    + 1) // rows
+                    offset = np.array((x0 / width,  y0 / height), dtype = np.float32)
+                    scale  = np.array(((x1 - x0) / width, (y1 - y0) / height), dtype = np.float32)
+                    if not self.MapTileUVs(layers, offset, scale):
+                        continue # Empty tile
+                    
+                    tile = bpy.data.images.new(
+                        name = self.TMP_TILE_IMAGE_NAME,
+                        width  = (x1 - x0) * tile_scale,
+                        height = (y1 - y0) * tile_scale,
+                        float_buffer = job.map.float_depth
+                    )
+                    self.SetColorSpace(tile, job.map)
+                    self.SetBakeImage(job.targets, tile)
+                    props.baking_map_size = (
+                        size_text + ' tile ' + str(row * columns + column + 1) + '/' + str(rows * columns)
+                    )
+                    
+                    accumulator = PixelAccumulator(tile) if job.accumulate else None
+                    for jitter in self.jitter_offsets(job):
+                        self.MapTileUVs(layers, offset, scale, jitter)
+                        yield from self.BakeSamples(context, bake_type, job.map, [tile])
+                        if accumulator is not None:
+                            accumulator.Add()
+                    if accumulator is not None:
+                        accumulator.Write()
+                    
+                    if tile_scale != 1:
+                        tile.scale(x1 - x0, y1 - y0)
+                    tile_pixels = np.empty((x1 - x0) * (y1 - y0) * 4, dtype = np.float32)
+                    tile.pixels.foreach_get(tile_pixels)
+                    pixels[y0:y1, x0:x1] = tile_pixels.reshape(y1 - y0, x1 - x0, 4)
+                    bpy.data.images.remove(tile)
+                    tile = None
+        finally:
+            if tile is not None:
+                bpy.data.images.remove(tile)
+            self.RemoveTileUVLayers(layers)
+            self.SetBakeImage(job.targets, job.image)
+        
+        job.image.pixels.foreach_set(pixels.ravel())
+    
+    def BakeAccumulated(self, context, bake_type, jobs):
+        # Averages jittered passes baked at the final size instead of scaling down a larger image
+        props = context.scene.BakeLabProps
+        size_text = props.baking_map_size
+        images = [job.image for job in jobs]
+        
+        layers = self.AddTileUVLayers(jobs)
+        accumulators = [PixelAccumulator(image) for image in images]
+        offsets = self.jitter_offsets(jobs[0])
+        offset = np.zeros(2, dtype = np.float32)
+        scale  = np.ones(2, dtype = np.float32)
+        try:
+            for i, jitter in enumerate(offsets):
+                self.MapTileUVs(layers, offset, scale, jitter)
+                props.baking_map_size = size_text + ' pass ' + str(i + 1) + '/' + str(len(offsets))
+                yield from self.BakeSamples(context, bake_type, jobs[0].map, images)
+                for accumulator in accumulators:
+                    accumulator.Add()
+        finally:
+            self.RemoveTileUVLayers(layers)
+        
+        for accumulator in accumulators:
+            accumulator.Write()
+    
+    def BakeCropped(self, context, bake_type, jobs):
+        # Maps the UV bounds of each job to its whole image
+        layers = self.AddTileUVLayers(jobs)
+        try:
+            self.MapTileUVs(layers, np.zeros(2, dtype = np.float32), np.ones(2, dtype = np.float32))
+            yield from self.BakeSamples(context, bake_type, jobs[0].map, [job.image for job in jobs])
+        finally:
+            self.RemoveTileUVLayers(layers)
+    
+    def split_shared_data(self, jobs):
+        # Objects sharing mesh data share material slots, they can't be baked in one call,
+        # neither can jobs that accumulate or tile and jobs that don't
+        batches = []
+        batch_datas = []
+        for job in jobs:
+            job_datas = {obj.data for obj in job.targets}
+            mode = (job.accumulate, job.tiles)
+            for batch, datas in zip(batches, batch_datas):
+                if (batch[0].accumulate, batch[0].tiles) == mode and datas.isdisjoint(job_datas):
+                    batch.append(job)
+                    datas.update(job_datas)
+                    break
+            else:
+                batches.append([job])
+                batch_datas.append(job_datas)
+        return batches
+    
+    def ApplyFarmResult(self, context, farm_job, status, jobs):
+        props = context.scene.BakeLabProps
+        if status.get('warning'):
+            self.report(type = {'WARNING'}, message = 'Farm job ' + str(farm_job.index) + ': ' + status['warning'])
+        for info in status['images']:
+            if not info['filepath']:
+                continue
+            map = farm_job.maps[info['map_index']]
+            job = jobs[(info['objects'][0], map)]
+            job.image = bpy.data.images.load(info['filepath'], check_existing = False)
+            job.image.name = info['image']
+            self.SetColorSpace(job.image, map)
+            if job.hash is not None:
+                TagImage(job.image, job)
+            if info.get('constant') is not None:
+                job.image[CONSTANT_KEY] = info['constant']
+            if job.crop is not None:
+                job.image[CROP_KEY] = job.crop
+            if props.save_or_pack == 'PACK':
+                job.image.pack()
+            context.scene.BakeLab_Data[job.data].AddMap(map, job.image) # Save baking data
+            self.progress.Finish([job])
+    
+    def FarmBake(self, context, plan):
+        props = context.scene.BakeLabProps
+        if not plan.jobs:
+            return
+        
+        self.farm = BakeFarm(
+            props.farm_workers,
+            props.farm_threads,
+            props.farm_timeout,
+            props.farm_retries
+        )
+        self.farm.Start()
+        
+        # Identical objects were already shared here and workers bake each map on its own,
+        # results name the spec map they were baked from
+        spec = {'properties': {'share_identical': False, 'pack_scalar_passes': False}}
+        if props.save_or_pack == 'SAVE':
+            spec['output_dir'] = bpy.path.abspath(props.save_path)
+        else:
+            spec['output_dir'] = self.farm.ImageDir()
+        
+        jobs = {}
+        for job in plan.jobs:
+            for obj in job.targets:
+                jobs[(obj.name, job.map)] = job
+        
+        # Split into farm jobs {
+        weights = plan.job_weights()
+        farm_jobs = [] # (weight, spec, maps)
+        if props.bake_mode == 'INDIVIDUAL':
+            # Objects with the same maps left to bake share farm jobs
+            object_maps = {}
+            for job in plan.jobs:
+                object_maps.setdefault(job.targets[0], []).append(job.map)
+            object_groups = {}
+            for obj, maps in object_maps.items():
+                object_groups.setdefault(tuple(maps), []).append(obj)
+            
+            chunk_size = props.farm_objects_per_job
+            for maps, objects in object_groups.items():
+                map_specs = [MapToDict(map) for map in maps]
+                for i in range(0, len(objects), chunk_size):
+                    chunk = objects[i:i + chunk_size]
+                    farm_jobs.append((
+                        sum(weights[jobs[(obj.name, map)]] for obj in chunk for map in maps),
+                        dict(spec,
+                            objects = [obj.name for obj in chunk],
+                            maps    = map_specs
+                        ),
+                        list(maps)
+                    ))
+        else:
+            if props.bake_mode == 'TO_ACTIVE':
+                spec['active_object'] = plan.active_object.name
+            for job in plan.jobs:
+                farm_jobs.append((
+                    weights[job],
+                    dict(spec,
+                        objects = [obj.name for obj in plan.selected_objects],
+                        maps    = [MapToDict(job.map)]
+                    ),
+                    [job.map]
+                ))
+        # Longest first, the last jobs to finish are short and the workers end together
+        farm_jobs.sort(key = lambda farm_job: farm_job[0], reverse = True)
+        for weight, job_spec, maps in farm_jobs:
+            self.farm.AddJob(job_spec, maps)
+        # }
+        
+        while not self.farm.Done():
+            results = self.farm.Poll()
+            for job, status in results:
+                self.ApplyFarmResult(context, job, status, jobs)
+            props.baking_farm_status = (
+                str(self.farm.finished_count) + ' of ' + str(self.farm.job_count) +
+                ' jobs, ' + str(len(self.farm.running)) + ' running'
+            )
+            self.UpdateProgress(props)
+            yield 1 if results else 2
+        
+        if self.farm.failed:
+            self.report(
+                type = {'WARNING'},
+                message = str(len(self.farm.failed)) + ' bake jobs failed, logs are in ' + self.farm.temp_dir
+            )
+        self.farm.Cleanup()
+        self.farm = None
+    
+    def UpdateDisplayStatus(self, props, obj, job, image):
+        map = job.map
         props.baking_obj_name = obj.name
         if map.type == 'CustomPass':
             props.baking_map_type = map.pass_name + '(Custom Pass)'
         else:
             props.baking_map_type = map.type
         props.baking_map_name = image.name
-        props.baking_map_size = str(map.target_width) + 'x' + str(map.target_height)
-        if map.final_aa != 1:
-            props.baking_map_size += str(' (' + str(map.final_aa)+'X)')
+        props.baking_map_size = str(job.width) + 'x' + str(job.height)
+        if job.aa != 1:
+            props.baking_map_size += str(' (' + str(job.aa)+'X)')
+    
+    def UpdateProgress(self, props):
+        remaining = self.progress.Remaining()
+        throughput = self.progress.Throughput()
+        props.baking_eta = FormatSeconds(remaining) if remaining is not None else ""
+        props.baking_throughput = FormatCount(throughput) + ' texels/s' if throughput is not None else ""
+    
+    def start_bake_timing(self):
+        self.bake_seconds = 0.0 # Spent in cycles, see BakeImage
+        self.pass_samples = []  # Samples each texel got per pass, progressive bakes may stop early
+    
+    def RecordBake(self, context, jobs):
+        # One row per cycles call, batched jobs are summed
+        if self.history is None or not self.pass_samples:
+            return
+        self.history.Record(
+            DeviceKey(context.scene),
+            jobs[0].map.type,
+            sum(job.bake_pixels() for job in jobs),
+            round(sum(self.pass_samples) / len(self.pass_samples)),
+            sum(job.triangles for job in jobs),
+            self.bake_seconds
+        )
+    
+    def BakeJobs(self, context, jobs):
+        # Bakes jobs of the same map with one cycles call
+        scene = context.scene
+        props = scene.BakeLabProps
+        map = jobs[0].map
+        
+        if len(jobs) > 1 and any(job.tiles for job in jobs):
+            # Tiled jobs move their own UV maps, they are baked alone
+            for job in jobs:
+                yield from self.BakeJobs(context, [job])
+            return
+        
+        self.start_bake_timing()
+        reserved_objects = []
+        for job in jobs:
+            for obj in job.sources + job.targets:
+                if obj not in reserved_objects:
+                    reserved_objects.append(obj)
+                    self.ReserveMaterials(obj)
+        
+        for job in jobs:
+            channel_maps = None
+            if job.channels:
+                for channel in job.channels:
+                    channel.image = self.PrepareImage(context, channel)
+                job.image = job.channels[0].image
+                channel_maps = [channel.map for channel in job.channels]
+            else:
+                job.image = self.PrepareImage(context, job)
+            with self.tracer.Stage('stage_materials', map = map.name, objects = len(job.targets)):
+                for obj in job.targets:
+                    if job.sources is job.targets:
+                        self.PrepareMaterials(context, obj, {obj}, map, job.image, channel_maps)
+                    else:
+                        self.PrepareMaterials(context, obj, job.sources, map, job.image, channel_maps)
+        bake_type = self.init_bake_settings(context, map)
+        context.scene.cycles.samples = max(
+            channel.map.samples for job in jobs for channel in (job.channels or [job])
+        )
+        
+        # Passes resolving to one color are filled without baking {
+        baked_jobs = []
+        for job in jobs:
+            if bake_type == 'EMIT' and job.sources is job.targets:
+                color = self.ConstantColor(job.targets)
+                if color is not None and self.FillConstant(job, color):
+                    continue
+            baked_jobs.append(job)
+        # }
+        
+        if baked_jobs:
+            bake_objects = []
+            for job in baked_jobs:
+                for obj in job.sources + job.targets:
+                    if obj not in bake_objects:
+                        bake_objects.append(obj)
+            
+            active_object = baked_jobs[0].targets[0]
+            self.UpdateDisplayStatus(props, active_object, baked_jobs[0], baked_jobs[0].image)
+            if len(baked_jobs) > 1:
+                props.baking_obj_name = str(len(baked_jobs)) + ' objects'
+            
+            self.bake_objects = (active_object, bake_objects)
+            with self.tracer.Stage('cycles_bake',
+                map     = map.name,
+                type    = bake_type,
+                objects = len(bake_objects),
+                images  = len(baked_jobs),
+                samples = context.scene.cycles.samples,
+                **ImageArgs(baked_jobs[0].image)
+            ):
+                if baked_jobs[0].tiles:
+                    yield from self.BakeTiles(context, bake_type, baked_jobs[0])
+                elif baked_jobs[0].accumulate:
+                    yield from self.BakeAccumulated(context, bake_type, baked_jobs)
+                elif any(job.crop for job in baked_jobs):
+                    yield from self.BakeCropped(context, bake_type, baked_jobs)
+                else:
+                    yield from self.BakeSamples(context, bake_type, map, [job.image for job in baked_jobs])
+        self.RestoreMaterials()
+        
+        for job in baked_jobs:
+            if job.channels:
+                with self.tracer.Stage('split_channels', map = map.name, **ImageArgs(job.image)):
+                    self.SplitChannels(job)
+        for job in jobs:
+            for channel in job.channels or [job]:
+                self.FinishImage(context, channel)
+                scene.BakeLab_Data[channel.data].AddMap(channel.map, channel.image) # Save baking data
+        if baked_jobs:
+            self.RecordBake(context, baked_jobs)
+        self.progress.Finish(jobs)
+        self.UpdateProgress(props)
     
     def Bake(self, context):
         yield 1
         scene = context.scene
         render = scene.render
         props = scene.BakeLabProps
-        self.original_materials = []
-        self.object_slots = []
         self.save_defaults(context)
+        self.tracer = OpenTracer(props)
+        
+        with self.tracer.Stage('plan'):
+            plan = BuildPlan(context)
+        plan.Display(props)
+        for message in plan.warnings:
+            self.report(type = {'WARNING'}, message = message)
+        if plan.errors:
+            self.report(type = {'ERROR'}, message = plan.errors[0])
+            yield -1
+        self.bake_cache = OpenBakeCache(props)
+        self.history = OpenBakeHistory(props)
+        self.progress = BakeProgress(plan.job_weights())
+        self.free_buffers = plan.free_buffers
         
         props.bake_state = 'BAKING'
         scene.render.engine = 'CYCLES'
@@ -638,228 +1513,135 @@ class Baker(Operator):
         scene.render.bake.cage_extrusion = props.cage_extrusion
         scene.render.bake.cage_object = None
         
-        
-        if len(self.default_selected_objects) == 0:
-            self.report(type = {'ERROR'}, message = 'Select some objects')
-            yield -1
-        selected_objects = [obj for obj in self.default_selected_objects if IsValidMesh(self, obj)]
-        active_object = self.default_active_object
-        if len(selected_objects) == 0:
-            self.report(type = {'ERROR'}, message = 'No valid objects selected, see console for more info')
-            yield -1
-            
-        if len(scene.BakeLabMaps) == 0:
-            self.report(type = {'ERROR'}, message = 'Add bake maps')
-            yield -1
-        
         props.baking_map_index = 0
         props.baking_obj_index = 0
-        props.baking_map_count = 0
-        for map in scene.BakeLabMaps:
-            if map.enabled:
-                props.baking_map_count += 1
-        props.baking_obj_count = len(selected_objects)
+        props.baking_map_count = len(plan.maps)
+        props.baking_obj_count = len(plan.selected_objects)
+        props.baking_farm_status = ""
+        self.UpdateProgress(props)
+        
+        # Save baking data {
+        data_start = len(scene.BakeLab_Data)
+        for objs in plan.data:
+            baked_data = scene.BakeLab_Data.add()
+            for obj in objs:
+                baked_data.AddObj(obj)
+        for job in plan.jobs:
+            job.data += data_start
+        # }
+        
+        # Unchanged since the last bake or found in the bake cache {
+        for job in plan.jobs:
+            if job.cache_path:
+                with self.tracer.Stage('load_cached', map = job.map.name, image = job.image_name()):
+                    if not self.LoadCachedImage(context, job):
+                        job.cache_path = None
+            if job.reuse or job.cache_path:
+                scene.BakeLab_Data[job.data].AddMap(job.map, job.image)
+        shared_jobs = plan.shared_jobs()
+        plan.jobs = plan.bake_jobs()
+        # }
         
         ##########################################################################################
-        if props.bake_mode == "INDIVIDUAL":
-            for obj in selected_objects:
-                if len(obj.data.uv_layers) == 0:
-                    self.report(type = {'ERROR'}, message = 'Not all objects have UV maps')
-                    yield -1
-                    
+        if props.use_bake_farm:
+            with self.tracer.Stage('farm', jobs = len(plan.jobs)):
+                yield from self.FarmBake(context, plan)
+        ##########################################################################################
+        elif props.bake_mode == "INDIVIDUAL":
             render.bake.use_selected_to_active = False
             
-            for obj in selected_objects:
-                # Save baking data {
-                baked_data = scene.BakeLab_Data.add()
-                baked_data.AddObj(obj)
-                # }
-                props.baking_obj_index += 1
-                SelectObject(obj)
-                props.baking_map_index = 0
-                for map in scene.BakeLabMaps:
-                    if not map.enabled:
-                        continue
+            if props.batch_bake:
+                for map in plan.maps:
                     props.baking_map_index += 1
-                    
-                    self.ReserveMaterials(obj)
-                    bake_image = self.PrepareImage(context, map, {obj}, obj.name)
-                    self.PrepareMaterials(context, obj, {obj}, map, bake_image)
-                    bake_type = self.init_bake_settings(context, map)
-                    
-                    self.UpdateDisplayStatus(props,obj,map,bake_image)
-                    
-                    # Bake {
-                    while bpy.ops.object.bake('INVOKE_DEFAULT', type = bake_type) != {'RUNNING_MODAL'}:
-                        yield 1
-                    while not bake_image.is_dirty:
-                        yield 1
-                    # }
-
-                    self.down_scale(bake_image, props, map)
-                    if props.save_or_pack == 'PACK':
-                        bake_image.pack()
-                    else:
-                        bake_image.save_render(bake_image.filepath)
-                    
-                    baked_data.AddMap(map, bake_image) # Save baking data
-                    self.RestoreMaterials()
+                    props.baking_obj_index = 0
+                    for batch in self.split_shared_data(plan.map_jobs(map)):
+                        props.baking_obj_index += len(batch)
+                        yield from self.BakeJobs(context, batch)
+            else:
+                obj = None
+                for job in plan.jobs:
+                    if job.targets[0] is not obj:
+                        obj = job.targets[0]
+                        props.baking_obj_index += 1
+                        props.baking_map_index = 0
+                    props.baking_map_index += 1
+                    yield from self.BakeJobs(context, [job])
         ##########################################################################################
         elif props.bake_mode == "ALL_TO_ONE":
-             # Check UVs {
-            for obj in selected_objects:
-                if len(obj.data.uv_layers) == 0:
-                    self.report(type = {'ERROR'}, message = 'Not all objects have UV maps')
-                    yield -1
-            # }
-            
-             # Save baking data {
-            baked_data = scene.BakeLab_Data.add()
-            for obj in selected_objects:
-                baked_data.AddObj(obj)
-            # }
-            
-            if props.pre_join_mesh:
+            if props.pre_join_mesh and plan.jobs:
                 render.bake.use_selected_to_active = True
                 render.bake.use_cage = True
                 render.bake.cage_extrusion = props.cage_extrusion
-            
-                merged_object = self.create_merged_object(context, selected_objects)
-                SelectObjects(merged_object, selected_objects)
+                
+                with self.tracer.Stage('merge_mesh', objects = len(plan.selected_objects)):
+                    merged_object = self.create_merged_object(context, plan.selected_objects)
+                for job in plan.jobs:
+                    job.targets = [merged_object]
             else:
                 render.bake.use_selected_to_active = False
-                
-            props.baking_map_index = 0
             
-            for map in scene.BakeLabMaps:
-                if not map.enabled:
-                    continue
+            for job in plan.jobs:
                 props.baking_map_index += 1
                 
-                if props.pre_join_mesh:
-                    for obj in selected_objects:
-                        self.ReserveMaterials(obj)
+                if props.pre_join_mesh or props.batch_bake:
+                    yield from self.BakeJobs(context, [job])
+                    continue
+                
+                render.bake.use_clear = False
+                self.start_bake_timing()
+                job.image = self.PrepareImage(context, job)
+                for obj in job.targets:
+                    self.ReserveMaterials(obj)
+                    with self.tracer.Stage('stage_materials', map = job.map.name, object = obj.name):
+                        self.PrepareMaterials(context, obj, {obj}, job.map, job.image)
+                    bake_type = self.init_bake_settings(context, job.map)
                     
-                    bake_image = self.PrepareImage(context, map, {merged_object}, props.global_image_name)
-                    self.PrepareMaterials(context, merged_object, selected_objects, map, bake_image)
-                    bake_type = self.init_bake_settings(context, map)
+                    self.UpdateDisplayStatus(props, obj, job, job.image)
                     
-                    self.UpdateDisplayStatus(props,obj,map,bake_image)
+                    self.bake_objects = (obj, [obj])
+                    with self.tracer.Stage('cycles_bake',
+                        map     = job.map.name,
+                        type    = bake_type,
+                        object  = obj.name,
+                        samples = context.scene.cycles.samples,
+                        **ImageArgs(job.image)
+                    ):
+                        yield from self.BakeImage(context, bake_type, job.image)
+                    self.pass_samples.append(context.scene.cycles.samples)
                     
-                    # Bake {
-                    while bpy.ops.object.bake('INVOKE_DEFAULT', type = bake_type) != {'RUNNING_MODAL'}:
-                        yield 1
-                    while not bake_image.is_dirty:
-                        yield 1
-                    # }
-
-                    self.RestoreMaterials()
-
-                    self.down_scale(bake_image, props, map)
-                    if props.save_or_pack == 'PACK':
-                        bake_image.pack()
-                    else:
-                        bake_image.save_render(bake_image.filepath)
-                else:
-                    render.bake.use_clear = False
-                    bake_image = self.PrepareImage(context, map, selected_objects, props.global_image_name)
-                    for obj in selected_objects:
-                        SelectObject(obj)
-                        self.ReserveMaterials(obj)
-                        
-                        self.PrepareMaterials(context, obj, {obj}, map, bake_image)
-                        bake_type = self.init_bake_settings(context, map)
-                        
-                        self.UpdateDisplayStatus(props, obj, map, bake_image)
-                        
-                        # Bake {
-                        while bpy.ops.object.bake('INVOKE_DEFAULT', type = bake_type) != {'RUNNING_MODAL'}:
-                            yield 1
-                        while not bake_image.is_dirty:
-                            yield 1
-                        # }
-                        
-                        if props.save_or_pack == 'PACK':
-                            bake_image.pack()
-                        else:
-                            bake_image.save_render(bake_image.filepath)
-                        
-                        self.RestoreMaterials()
-
-                    self.down_scale(bake_image, props, map)
                     if props.save_or_pack == 'PACK':
-                        bake_image.pack()
+                        with self.tracer.Stage('pack', map = job.map.name, **ImageArgs(job.image)):
+                            job.image.pack()
                     else:
-                        bake_image.save_render(bake_image.filepath)
+                        with self.tracer.Stage('save_render', map = job.map.name, **ImageArgs(job.image)):
+                            job.image.save_render(job.image.filepath)
                     
-                baked_data.AddMap(map, bake_image) # Save baking data
-
-            if props.pre_join_mesh:
-                merged_data = merged_object.data
-                bpy.data.objects.remove(merged_object)
-                bpy.data.meshes.remove(merged_data)
+                    self.RestoreMaterials()
+                
+                self.FinishImage(context, job)
+                scene.BakeLab_Data[job.data].AddMap(job.map, job.image) # Save baking data
+                self.RecordBake(context, [job])
+                self.progress.Finish([job])
+                self.UpdateProgress(props)
+            
+            if props.pre_join_mesh and plan.jobs:
+                bpy.data.objects.remove(merged_object) # The mesh stays for the next bake
         ##########################################################################################
         elif props.bake_mode == "TO_ACTIVE":
-            if len(selected_objects) < 2:
-                self.report(type = {'ERROR'}, message = 'Select atleast two mesh objects')
-                yield -1
-            if active_object.type != 'MESH':
-                self.report(type = {'ERROR'}, message = 'Active object is not mesh type')
-                yield -1
-            if len(active_object.data.uv_layers) == 0:
-                self.report(type = {'ERROR'}, message = 'Active object does not have UV maps')
-                yield -1
-                
             render.bake.use_selected_to_active = True
             render.bake.use_cage = True
             render.bake.cage_extrusion = props.cage_extrusion
             
-             # Save baking data {
-            baked_data = scene.BakeLab_Data.add()
-            baked_data.AddObj(active_object)
-            # }
-            
-            SelectObjects(active_object, selected_objects)
-                
-            props.baking_map_index = 0
-                
-            for map in scene.BakeLabMaps:
-                if not map.enabled:
-                    continue
+            for job in plan.jobs:
                 props.baking_map_index += 1
-                
-                for obj in selected_objects:
-                    self.ReserveMaterials(obj)
-                
-                bake_image = self.PrepareImage(context, map, {active_object}, active_object.name)
-                self.PrepareMaterials(
-                    context, 
-                    active_object, 
-                    [obj for obj in selected_objects 
-                        if obj is not active_object], 
-                    map, 
-                    bake_image
-                )
-                bake_type = self.init_bake_settings(context, map)
-                
-                self.UpdateDisplayStatus(props,obj,map,bake_image)
-                
-                # Bake {
-                while bpy.ops.object.bake('INVOKE_DEFAULT', type = bake_type) != {'RUNNING_MODAL'}:
-                    yield 1
-                while not bake_image.is_dirty:
-                    yield 1
-                # }
-
-                self.down_scale(bake_image, props, map)
-                if props.save_or_pack == 'PACK':
-                    bake_image.pack()
-                else:
-                    bake_image.save_render(bake_image.filepath)
-                
-                baked_data.AddMap(map, bake_image) # Save baking data
-                self.RestoreMaterials()
+                yield from self.BakeJobs(context, [job])
         ##########################################################################################
+        
+        # Identical objects point at the images of the one that was baked {
+        for job in shared_jobs:
+            if job.shared.image is not None:
+                scene.BakeLab_Data[job.data].AddMap(job.map, job.shared.image)
+        # }
         props.bake_state = 'BAKED'
         yield 0 #Done
         
@@ -870,15 +1652,25 @@ class Baker(Operator):
             return {'CANCELLED'}
 
         if event.type == 'TIMER':
-            if context.scene.BakeLabProps.bake_state == 'BAKING':
+            # Run as many steps as fit in the budget, stop early while cycles is baking
+            deadline = time.perf_counter() + self.STEP_BUDGET
+            redraw = False
+            while True:
+                result = next(self.BakeCrt)
+                if result == -1:
+                    self.cancel(context)
+                    return {'CANCELLED'}
+                if result == 0:
+                    self.finish(context)
+                    context.area.tag_redraw()
+                    return {'FINISHED'}
+                if result == 2:
+                    break
+                redraw = True
+                if time.perf_counter() > deadline:
+                    break
+            if redraw and context.scene.BakeLabProps.bake_state == 'BAKING':
                 context.area.tag_redraw() # Update UI
-            result = next(self.BakeCrt)
-            if result == -1:
-                self.cancel(context)
-                return {'CANCELLED'}
-            if result == 0:
-                self.finish(context)
-                return {'FINISHED'}
 
         return {'RUNNING_MODAL'}
         
@@ -887,16 +1679,61 @@ class Baker(Operator):
         self.finish(context)
             
     def finish(self, context):
+        if self.bake_job_running():
+            self.DeferMaterialCleanup()
+        else:
+            self.RestoreMaterials() # Slots left staged by a cancelled bake
+            self.RemoveStagedMaterials()
+        self.remove_bake_handlers()
+        if self.farm is not None:
+            self.farm.Cleanup()
+            self.farm = None
+        if self.bake_cache is not None:
+            self.bake_cache.Evict()
+            self.bake_cache = None
+        if self.history is not None:
+            self.history.Close()
+            self.history = None
         self.restore_defaults(context)
         if self.BakeCrt.gi_running:
             self.BakeCrt.close()
+        filepath = self.tracer.Write(TraceDir(context.scene.BakeLabProps), 'bake')
+        self.tracer = NullTracer()
+        if filepath is not None:
+            self.report(type = {'INFO'}, message = 'Trace written to ' + filepath)
         wm = context.window_manager
         if self._timer:
             wm.event_timer_remove(self._timer)
+    
+    def run_synchronous(self, context):
+        # Background mode has no window or timers, run every step in place
+        self.synchronous = True
+        for result in self.BakeCrt:
+            if result == -1:
+                self.cancel(context)
+                return {'CANCELLED'}
+            if result == 0:
+                self.finish(context)
+                return {'FINISHED'}
+            if result == 2:
+                time.sleep(self.TIMER_STEP)
+        self.cancel(context)
+        return {'CANCELLED'}
 
     def execute(self, context):
+        self.original_materials = []
+        self.object_slots = []
+        self.reserved_datas = set()
+        self.staged_materials = {} # (source material, transform, variant): staged copy
+        self.staged_sources = {}   # staged copy: its key
+        self.staged_images = {}    # staged copy: image it bakes into in the current call
+        self.flattener = NodeFlattener()
+        self.start_bake_timing()
         self.BakeCrt = self.Bake(context)
+        if bpy.app.background:
+            return self.run_synchronous(context)
+        self.add_bake_handlers()
         wm = context.window_manager
-        self._timer = wm.event_timer_add(0.5, window=context.window)
+        self._timer = wm.event_timer_add(self.TIMER_STEP, window=context.window)
         wm.modal_handler_add(self)
         return {'RUNNING_MODAL'}
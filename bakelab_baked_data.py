@@ -11,10 +11,15 @@ from bpy.props import (
             EnumProperty,
             BoolProperty,
             FloatProperty,
+            FloatVectorProperty,
             StringProperty,
             PointerProperty,
             CollectionProperty
         )
+
+CONSTANT_KEY = 'bakelab_constant' # Image custom property, color of images filled without baking
+CROP_KEY = 'bakelab_uv_crop' # Image custom property, (u, v, width, height) of the UV space a cropped image covers
+
 class BakeObjData(PropertyGroup):
     obj : PointerProperty(
         type=bpy.types.Object
@@ -26,6 +31,22 @@ class BakeMapData(PropertyGroup):
     image : PointerProperty(
         type=bpy.types.Image
     )
+    is_constant : BoolProperty(
+        default = False
+    )
+    constant_value : FloatVectorProperty(
+        size = 3,
+        subtype = 'COLOR'
+    )
+    is_cropped : BoolProperty(
+        default = False
+    )
+    uv_crop : FloatVectorProperty(
+        size = 4
+    )
+    map_index : IntProperty( # Scene BakeLabMaps item it was baked from
+        default = -1
+    )
 
 class BakeLab_BakedData(PropertyGroup):
     obj_list : CollectionProperty(
@@ -45,5 +66,12 @@ class BakeLab_BakedData(PropertyGroup):
         item.bake_map.type = bake_map.type
         item.bake_map.pass_name = bake_map.pass_name
         item.bake_map.normal_space = bake_map.normal_space
+        item.map_index = bakelab_map.MapIndex(bake_map)
         
         item.image = image
+        if image is not None and CONSTANT_KEY in image:
+            item.is_constant = True
+            item.constant_value = image[CONSTANT_KEY]
+        if image is not None and CROP_KEY in image:
+            item.is_cropped = True
+            item.uv_crop = image[CROP_KEY]
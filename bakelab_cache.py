@@ -0,0 +1,87 @@
+import os
+import shutil
+import bpy
+
+# Maps that only depend on the object and its materials, lights and
+# surrounding objects don't change them, so they can be shared between files
+CACHEABLE_MAPS = {
+    'Albedo', 'Normal', 'UV', 'Roughness', 'Emission', 'Displacement', 'CustomPass'
+}
+
+def IsCacheable(map):
+    return map.type in CACHEABLE_MAPS
+
+class BakeCache:
+    """Baked images on disk, named by the hash of their bake inputs"""
+    def __init__(self, directory, size_limit):
+        self.directory  = directory
+        self.size_limit = size_limit # Bytes, 0 = no limit
+
+    def FilePath(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def Find(self, key, extension):
+        filepath = self.FilePath(key, extension)
+        if not os.path.isfile(filepath):
+            return None
+        try:
+            os.utime(filepath) # Recently used, evicted last
+        except OSError:
+            pass
+        return filepath
+
+    def Store(self, key, extension, image):
+        filepath = self.FilePath(key, extension)
+        # Written under a hidden name and renamed, other blenders never read half written files
+        tmp_filepath = os.path.join(
+            os.path.dirname(filepath),
+            '.' + str(os.getpid()) + '_' + os.path.basename(filepath)
+        )
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok = True)
+            if image.packed_file is None and os.path.isfile(image.filepath):
+                shutil.copyfile(image.filepath, tmp_filepath)
+            else:
+                image.save_render(tmp_filepath)
+            os.replace(tmp_filepath, filepath)
+        except (OSError, RuntimeError):
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            return False
+        return True
+
+    def Evict(self):
+        # Remove least recently used images until the cache fits the limit
+        if self.size_limit <= 0:
+            return
+        entries = []
+        total_size = 0
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                filepath = os.path.join(root, name)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filepath))
+                total_size += stat.st_size
+
+        entries.sort()
+        for mtime, size, filepath in entries:
+            if total_size <= self.size_limit:
+                break
+            try:
+                os.remove(filepath)
+            except OSError:
+                continue
+            total_size -= size
+
+def OpenBakeCache(props):
+    if not props.use_bake_cache or not props.cache_path:
+        return None
+    return BakeCache(
+        bpy.path.abspath(props.cache_path),
+        props.cache_size_limit * 1024 * 1024
+    )
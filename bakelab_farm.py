@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import bpy
+
+JOB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bakelab_job.py')
+
+def CyclesDevices():
+    # Workers start with factory settings, they get the GPU setup of this session from the spec
+    addon = bpy.context.preferences.addons.get('cycles')
+    if addon is None:
+        return None
+    cycles_prefs = addon.preferences
+    return {
+        'type'    : cycles_prefs.compute_device_type,
+        'devices' : [device.id for device in cycles_prefs.devices if device.use]
+    }
+
+class FarmJob:
+    def __init__(self, index, spec, maps):
+        self.index    = index
+        self.spec     = spec
+        self.maps     = maps     # BakeLabMap items, in the order of spec['maps']
+        self.attempts = 0
+        self.process  = None
+        self.log_file = None
+        self.start_time  = 0.0
+        self.status_file = ''
+
+class BakeFarm:
+    """Runs bake jobs in background blender processes"""
+    def __init__(self, workers, threads, timeout, retries):
+        self.workers = max(1, workers)
+        self.threads = threads
+        if self.threads <= 0:
+            self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.timeout = timeout
+        self.retries = retries
+
+        self.queue   = []
+        self.running = []
+        self.failed  = []
+        self.finished_count = 0
+        self.job_count = 0
+        self.temp_dir   = None
+        self.blend_path = None
+        self.cycles_devices = None
+
+    def Start(self):
+        self.temp_dir = tempfile.mkdtemp(prefix = 'bakelab_farm_')
+        self.blend_path = os.path.join(self.temp_dir, 'scene.blend')
+        # Workers bake from a copy of the current state, saved or not
+        bpy.ops.wm.save_as_mainfile(filepath = self.blend_path, copy = True)
+        self.cycles_devices = CyclesDevices()
+
+    def ImageDir(self):
+        return os.path.join(self.temp_dir, 'images')
+
+    def AddJob(self, spec, maps):
+        spec = dict(spec)
+        spec['threads'] = self.threads
+        if self.cycles_devices is not None:
+            spec['cycles_devices'] = self.cycles_devices
+        spec.setdefault('properties', {})['use_bake_farm'] = False
+        self.queue.append(FarmJob(self.job_count, spec, maps))
+        self.job_count += 1
+
+    def Launch(self, job):
+        job.attempts += 1
+        name = 'job_' + str(job.index) + '_' + str(job.attempts)
+        job_file = os.path.join(self.temp_dir, name + '.json')
+        job.status_file = os.path.join(self.temp_dir, name + '_status.json')
+        job.spec['status_file'] = job.status_file
+        with open(job_file, 'w') as file:
+            json.dump(job.spec, file)
+
+        job.log_file = open(os.path.join(self.temp_dir, name + '.log'), 'w')
+        job.process = subprocess.Popen(
+            [
+                bpy.app.binary_path,
+                '--background',
+                '--factory-startup',
+                self.blend_path,
+                '--python', JOB_SCRIPT,
+                '--', job_file
+            ],
+            stdout = job.log_file,
+            stderr = subprocess.STDOUT
+        )
+        job.start_time = time.perf_counter()
+        self.running.append(job)
+
+    def ReadStatus(self, job):
+        try:
+            with open(job.status_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def Poll(self):
+        # Returns (job, status) pairs of jobs finished since the last poll
+        results = []
+        for job in list(self.running):
+            return_code = job.process.poll()
+            if return_code is None:
+                if self.timeout > 0 and time.perf_counter() - job.start_time > self.timeout:
+                    job.process.kill()
+                    job.process.wait()
+                    return_code = -1
+                else:
+                    continue
+
+            self.running.remove(job)
+            job.log_file.close()
+            job.process = None
+
+            status = self.ReadStatus(job) if return_code == 0 else None
+            if status is not None and status.get('status') == 'FINISHED':
+                self.finished_count += 1
+                results.append((job, status))
+            elif job.attempts <= self.retries:
+                self.queue.append(job)
+            else:
+                self.failed.append(job)
+
+        while self.queue and len(self.running) < self.workers:
+            self.Launch(self.queue.pop(0))
+        return results
+
+    def Done(self):
+        return len(self.queue) == 0 and len(self.running) == 0
+
+    def Stop(self):
+        for job in self.running:
+            job.process.kill()
+            job.process.wait()
+            job.log_file.close()
+        self.running.clear()
+        self.queue.clear()
+
+    def Cleanup(self):
+        self.Stop()
+        if self.temp_dir and not self.failed:
+            shutil.rmtree(self.temp_dir, ignore_errors = True)
+        self.temp_dir = None
@@ -0,0 +1,324 @@
+import os
+import hashlib
+import numpy as np
+import bpy
+
+from .bakelab_map import MapToDict
+from .bakelab_tools import (
+    RenderUVLayer,
+    CornerNormals
+)
+
+HASH_KEY = 'bakelab_hash'
+NAME_KEY = 'bakelab_name'
+
+# Fields that don't change the baked pixels
+IGNORED_MAP_PROPS = {'name', 'enabled', 'target_width', 'target_height', 'final_aa'}
+BAKE_PROPS = (
+    'bake_mode',
+    'cage_extrusion',
+    'pre_join_mesh',
+    'image_size',
+    'texel_per_unit',
+    'image_min_size',
+    'image_max_size',
+    'round_adaptive_image',
+    'crop_uv_bounds',
+    'anti_alias',
+    'aa_mode',
+    'bake_margin'
+)
+IGNORED_NODE_PROPS = {
+    'name', 'label', 'location', 'width', 'width_hidden', 'height', 'dimensions',
+    'select', 'hide', 'show_options', 'show_preview', 'show_texture',
+    'use_custom_color', 'color', 'parent'
+}
+VALUE_TYPES = {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}
+# Node type: outputs that change when the object is moved
+WORLD_OUTPUTS = {
+    'NEW_GEOMETRY' : {'Position', 'Normal', 'Tangent', 'True Normal', 'Incoming'},
+    'TEX_COORD'    : {'Window', 'Reflection', 'Camera'},
+    'OBJECT_INFO'  : {'Location'},
+    'CAMERA'       : {'View Vector', 'View Z Depth', 'View Distance'},
+}
+# Attribute data type: (foreach_get name, values per element)
+ATTRIBUTE_VALUES = {
+    'FLOAT'        : ('value',  1, np.float32),
+    'INT'          : ('value',  1, np.int32),
+    'INT8'         : ('value',  1, np.int32),
+    'BOOLEAN'      : ('value',  1, bool),
+    'FLOAT2'       : ('vector', 2, np.float32),
+    'FLOAT_VECTOR' : ('vector', 3, np.float32),
+    'FLOAT_COLOR'  : ('color',  4, np.float32),
+    'BYTE_COLOR'   : ('color',  4, np.float32),
+}
+
+def hash_value(h, value):
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    elif hasattr(value, '__len__') and not isinstance(value, str):
+        value = tuple(value)
+    h.update(repr(value).encode())
+
+def hash_array(h, collection, attr, size, dtype):
+    array = np.empty(len(collection) * size, dtype = dtype)
+    collection.foreach_get(attr, array)
+    h.update(array.tobytes())
+
+def image_hash(image):
+    h = hashlib.sha1()
+    filepath = bpy.path.abspath(image.filepath_raw, library = image.library)
+    h.update((image.source + filepath).encode())
+    if image.is_dirty and image.has_data:
+        # Painted in blender and not saved, only the pixels tell
+        pixels = np.empty(len(image.pixels), dtype = np.float32)
+        image.pixels.foreach_get(pixels)
+        h.update(pixels.tobytes())
+    elif image.packed_file is not None:
+        h.update(image.packed_file.data)
+    elif image.source == 'GENERATED':
+        hash_value(h, (image.generated_type, image.generated_width, image.generated_height, image.use_generated_float))
+        hash_value(h, image.generated_color)
+    else:
+        try: # Saved or exported again to the same path
+            stat = os.stat(filepath)
+            hash_value(h, (stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            pass
+    return h.hexdigest()
+
+def hash_rna(h, struct, ignored = (), hashed = None):
+    # hashed: digests of images already hashed in this plan
+    for prop in struct.bl_rna.properties:
+        if prop.is_readonly or prop.identifier in ignored:
+            continue
+        if prop.type in VALUE_TYPES:
+            hash_value(h, getattr(struct, prop.identifier))
+        elif prop.type == 'POINTER':
+            value = getattr(struct, prop.identifier)
+            if isinstance(value, bpy.types.ID):
+                # Names without library so linked and local data hash the same
+                h.update(value.name.encode())
+                if isinstance(value, bpy.types.Object):
+                    # Texture coordinates from another object follow its placement
+                    h.update(np.array(value.matrix_world, dtype = np.float32).tobytes())
+                if isinstance(value, bpy.types.Image):
+                    if hashed is None:
+                        hashed = {}
+                    if value not in hashed:
+                        hashed[value] = image_hash(value)
+                    h.update(hashed[value].encode())
+
+def hash_color_ramp(h, ramp):
+    hash_value(h, (ramp.interpolation, ramp.color_mode, ramp.hue_interpolation))
+    for element in ramp.elements:
+        hash_value(h, element.position)
+        hash_value(h, element.color)
+
+def hash_curve_mapping(h, mapping):
+    hash_value(h, (mapping.use_clip, mapping.clip_min_x, mapping.clip_min_y, mapping.clip_max_x, mapping.clip_max_y))
+    hash_value(h, mapping.black_level)
+    hash_value(h, mapping.white_level)
+    for curve in mapping.curves:
+        for point in curve.points:
+            hash_value(h, point.location)
+            hash_value(h, point.handle_type)
+
+def hash_attributes(h, mesh):
+    # Color and generic attributes, vertex paint and geometry nodes outputs a material can read
+    for attribute in mesh.attributes:
+        values = ATTRIBUTE_VALUES.get(attribute.data_type)
+        if values is None or attribute.name.startswith('.'):
+            continue
+        name, size, dtype = values
+        h.update((attribute.name + attribute.domain + attribute.data_type).encode())
+        hash_array(h, attribute.data, name, size, dtype)
+
+def ModifierSignature(obj):
+    # None when a modifier reads another object, its result changes with placement
+    h = hashlib.sha1()
+    visited = {}
+    for modifier in obj.modifiers:
+        for prop in modifier.bl_rna.properties:
+            if prop.type == 'POINTER' and isinstance(getattr(modifier, prop.identifier), bpy.types.Object):
+                return None
+        hash_rna(h, modifier, {'name'})
+        # Geometry nodes inputs are ID properties of the modifier
+        for key in sorted(modifier.keys()):
+            value = modifier[key]
+            if isinstance(value, (bpy.types.Object, bpy.types.Collection)):
+                return None
+            h.update(key.encode())
+            if isinstance(value, bpy.types.ID):
+                h.update(value.name.encode())
+            elif hasattr(value, 'to_dict'):
+                hash_value(h, sorted(value.to_dict().items()))
+            else:
+                hash_value(h, value)
+        node_group = getattr(modifier, 'node_group', None)
+        if node_group is not None:
+            hash_node_tree(h, node_group, visited)
+    return h.hexdigest()
+
+def MeshHash(obj, depsgraph, world_space = True):
+    h = hashlib.sha1()
+    mesh = obj.evaluated_get(depsgraph).data
+    hash_array(h, mesh.vertices, 'co',             3, np.float32)
+    hash_array(h, mesh.loops,    'vertex_index',   1, np.int32)
+    hash_array(h, mesh.polygons, 'loop_total',     1, np.int32)
+    hash_array(h, mesh.polygons, 'material_index', 1, np.int32)
+    hash_array(h, mesh.polygons, 'use_smooth',     1, bool)
+    for uv_layer in mesh.uv_layers:
+        h.update(uv_layer.name.encode())
+        hash_array(h, uv_layer.data, 'uv', 2, np.float32)
+    if mesh.uv_layers.active is not None:
+        h.update(mesh.uv_layers.active.name.encode())
+    hash_attributes(h, mesh)
+    matrix = np.array(obj.matrix_world, dtype = np.float64)
+    if world_space:
+        h.update(matrix.astype(np.float32).tobytes())
+    else:
+        # Placement and rotation don't change an object's own bake, scale and mirroring do
+        linear = matrix[:3, :3]
+        h.update(np.round(linear.T @ linear, 6).astype(np.float32).tobytes())
+        h.update(b'-' if np.linalg.det(linear) < 0 else b'+')
+    return h.hexdigest()
+
+def MergedMeshHash(objs, depsgraph):
+    h = hashlib.sha1()
+    for obj in objs:
+        h.update(MeshHash(obj, depsgraph).encode())
+        mesh = obj.evaluated_get(depsgraph).data
+        uv_layer = RenderUVLayer(mesh)
+        if uv_layer is not None:
+            h.update(uv_layer.name.encode())
+        if mesh.has_custom_normals:
+            h.update(CornerNormals(mesh).tobytes())
+    return h.hexdigest()
+
+def hash_node_tree(h, node_tree, visited):
+    if node_tree in visited:
+        h.update(visited[node_tree].encode())
+        return
+    tree_h = hashlib.sha1()
+    for node in node_tree.nodes:
+        tree_h.update((node.bl_idname + node.name).encode())
+        hash_rna(tree_h, node, IGNORED_NODE_PROPS, visited)
+        if isinstance(getattr(node, 'color_ramp', None), bpy.types.ColorRamp):
+            hash_color_ramp(tree_h, node.color_ramp)
+        if isinstance(getattr(node, 'mapping', None), bpy.types.CurveMapping):
+            hash_curve_mapping(tree_h, node.mapping)
+        for socket in node.inputs:
+            if not socket.is_linked and hasattr(socket, 'default_value'):
+                hash_value(tree_h, socket.default_value)
+        for socket in node.outputs: # Value and RGB nodes keep their value here
+            if hasattr(socket, 'default_value'):
+                hash_value(tree_h, socket.default_value)
+        if node.type == 'GROUP' and node.node_tree is not None:
+            hash_node_tree(tree_h, node.node_tree, visited)
+    for link in node_tree.links:
+        tree_h.update((
+            link.from_node.name + link.from_socket.identifier + '>' +
+            link.to_node.name + link.to_socket.identifier + str(link.is_muted)
+        ).encode())
+    visited[node_tree] = tree_h.hexdigest()
+    h.update(visited[node_tree].encode())
+
+def reads_world(node):
+    if node.type == 'TEX_COORD' and node.object is not None:
+        return any(socket.is_linked for socket in node.outputs)
+    if node.type in WORLD_OUTPUTS:
+        return any(socket.is_linked for socket in node.outputs if socket.name in WORLD_OUTPUTS[node.type])
+    if node.type == 'TEX_IMAGE':
+        return node.projection == 'BOX'
+    if node.type == 'VECT_TRANSFORM':
+        return node.convert_from != node.convert_to
+    if node.type == 'AMBIENT_OCCLUSION':
+        return not node.only_local
+    return False
+
+def node_tree_reads_world(node_tree, visited):
+    if node_tree not in visited:
+        visited[node_tree] = False # Recursive groups
+        visited[node_tree] = any(
+            reads_world(node) or
+            (node.type == 'GROUP' and node.node_tree is not None and node_tree_reads_world(node.node_tree, visited))
+            for node in node_tree.nodes if not node.mute
+        )
+    return visited[node_tree]
+
+def MaterialReadsWorld(mat, visited):
+    # True when the material depends on where the object is, e.g. world position or box projection
+    if mat is None or not mat.use_nodes or mat.node_tree is None:
+        return False
+    return node_tree_reads_world(mat.node_tree, visited)
+
+def MaterialHash(mat, visited):
+    h = hashlib.sha1()
+    if mat is None:
+        return 'NONE'
+    h.update(str(mat.use_nodes).encode())
+    if mat.use_nodes and mat.node_tree is not None:
+        hash_node_tree(h, mat.node_tree, visited)
+    else:
+        hash_value(h, mat.diffuse_color)
+    return h.hexdigest()
+
+def MapHash(map):
+    h = hashlib.sha1()
+    for key, value in sorted(MapToDict(map).items()):
+        if key not in IGNORED_MAP_PROPS:
+            h.update(key.encode())
+            hash_value(h, value)
+    return h.hexdigest()
+
+def PropsHash(props):
+    h = hashlib.sha1()
+    for key in BAKE_PROPS:
+        hash_value(h, getattr(props, key))
+    return h.hexdigest()
+
+def TagImage(image, job):
+    image[HASH_KEY] = job.hash
+    image[NAME_KEY] = job.image_name()
+
+class HashCache:
+    """Hashes of objects and materials, computed once per plan"""
+    def __init__(self, depsgraph, world_space):
+        self.depsgraph = depsgraph
+        self.world_space = world_space # Objects bake onto each other, their placement matters
+        self.objects = {}
+        self.materials = {}
+        self.node_trees = {} # Node trees and images hashed so far
+        self.world_trees = {} # Node tree: reads world space data
+
+    def material(self, mat):
+        if mat not in self.materials:
+            self.materials[mat] = MaterialHash(mat, self.node_trees)
+        return self.materials[mat]
+
+    def object(self, obj):
+        if obj not in self.objects:
+            h = hashlib.sha1()
+            world_space = self.world_space or any(
+                MaterialReadsWorld(slot.material, self.world_trees) for slot in obj.material_slots
+            )
+            h.update(MeshHash(obj, self.depsgraph, world_space).encode())
+            for slot in obj.material_slots:
+                h.update(self.material(slot.material).encode())
+            self.objects[obj] = h.hexdigest()
+        return self.objects[obj]
+
+def JobHash(job, props, cache):
+    # Depends only on what ends up in the pixels, not on object or image names
+    h = hashlib.sha1()
+    h.update(MapHash(job.map).encode())
+    h.update(PropsHash(props).encode())
+    hash_value(h, (job.width, job.height, job.aa))
+    h.update(b'targets')
+    for obj in job.targets:
+        h.update(cache.object(obj).encode())
+    h.update(b'sources')
+    for obj in job.sources:
+        h.update(cache.object(obj).encode())
+    return h.hexdigest()
@@ -0,0 +1,119 @@
+import os
+import time
+import sqlite3
+import numpy as np
+import bpy
+
+HISTORY_FILE = 'bakelab_history.sqlite'
+HISTORY_ROWS = 200 # Most recent bakes a model is fitted on
+MIN_ROWS = 3       # Fewer bakes can't fit the three coefficients
+
+class BakeHistory:
+    """Wall times of past cycles calls and a cost model fitted on them"""
+    def __init__(self, filepath):
+        # Farm workers write to the same file, wait for their locks
+        self.connection = sqlite3.connect(filepath, timeout = 10)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS bakes ('
+            'time REAL, device TEXT, map_type TEXT, '
+            'pixels INTEGER, samples INTEGER, triangles INTEGER, seconds REAL)'
+        )
+        self.models = {}
+
+    def Record(self, device, map_type, pixels, samples, triangles, seconds):
+        try:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT INTO bakes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (time.time(), device, map_type, pixels, samples, triangles, seconds)
+                )
+        except sqlite3.Error:
+            return
+        self.models.clear()
+
+    def fit(self, device, map_type):
+        # seconds = a + b * pixels * samples + c * triangles, least squares
+        query = 'SELECT pixels * samples, triangles, seconds FROM bakes WHERE device = ?'
+        params = [device]
+        if map_type is not None:
+            query += ' AND map_type = ?'
+            params.append(map_type)
+        query += ' ORDER BY rowid DESC LIMIT ?'
+        params.append(HISTORY_ROWS)
+        try:
+            rows = self.connection.execute(query, params).fetchall()
+        except sqlite3.Error:
+            return None
+        if len(rows) < MIN_ROWS:
+            return None
+        rows = np.array(rows, dtype = np.float64)
+        features = np.column_stack((np.ones(len(rows)), rows[:, 0], rows[:, 1]))
+        return np.linalg.lstsq(features, rows[:, 2], rcond = None)[0]
+
+    def model(self, device, map_type):
+        key = (device, map_type)
+        if key not in self.models:
+            self.models[key] = self.fit(device, map_type)
+        return self.models[key]
+
+    def Predict(self, device, map_type, cost, triangles):
+        # Seconds, None until the device has enough history
+        coefficients = self.model(device, map_type)
+        if coefficients is None: # Map type never baked, fit on all of them
+            coefficients = self.model(device, None)
+        if coefficients is None:
+            return None
+        return max(float(coefficients @ (1.0, cost, triangles)), 0.0)
+
+    def Close(self):
+        self.connection.close()
+
+def DeviceKey(scene):
+    # Farm workers bake on a share of the threads, their times are kept apart
+    device = scene.BakeLabProps.compute_device
+    if device == 'CPU' and scene.render.threads_mode == 'FIXED':
+        return device + str(scene.render.threads)
+    return device
+
+class BakeProgress:
+    """Remaining time of a bake, predictions scaled by how long the finished jobs took"""
+    def __init__(self, weights):
+        self.weights = weights # Job: predicted seconds or samples, see BakePlan.job_weights
+        self.done = set()
+        self.baked_texels = 0
+        self.start_time = time.perf_counter()
+
+    def Finish(self, jobs):
+        for job in jobs:
+            if job in self.weights and job not in self.done:
+                self.done.add(job)
+                self.baked_texels += job.bake_pixels()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def Remaining(self):
+        # Seconds, None until there is something to scale by
+        left = sum(weight for job, weight in self.weights.items() if job not in self.done)
+        finished = sum(self.weights[job] for job in self.done)
+        if finished > 0:
+            return left * self.elapsed() / finished
+        if all(job.seconds is not None for job in self.weights):
+            return left
+        return None
+
+    def Throughput(self):
+        # Baked texels per second, anti-aliasing samples included
+        elapsed = self.elapsed()
+        if not self.done or elapsed <= 0:
+            return None
+        return self.baked_texels / elapsed
+
+def OpenBakeHistory(props):
+    if not props.use_bake_history:
+        return None
+    try:
+        directory = bpy.utils.user_resource('CONFIG', create = True)
+        return BakeHistory(os.path.join(directory, HISTORY_FILE))
+    except (OSError, sqlite3.Error):
+        return None
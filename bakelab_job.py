@@ -0,0 +1,228 @@
+# Headless bake driver
+#
+# Usage:
+#   blender -b scene.blend --python <addon folder>/bakelab_job.py -- job.json
+#
+# job.json:
+#   {
+#       "objects"       : ["Cube", "Suzanne"],
+#       "active_object" : "Cube",
+#       "maps"          : [{"type": "Albedo"}, {"type": "Normal", "samples": 8}],
+#       "properties"    : {"bake_mode": "INDIVIDUAL", "anti_alias": 2},
+#       "output_dir"    : "//textures",
+#       "status_file"   : "status.json",
+#       "threads"       : 4,
+#       "cycles_devices": {"type": "CUDA", "devices": ["CUDA_NVIDIA GeForce_0000:01:00"]}
+#   }
+#
+# "maps" entries and "properties" take any BakeLabMap / BakeLabProperties field.
+# Images are saved into "output_dir", or packed if it is omitted; "save_blend"
+# writes a copy of the baked blend file to keep packed images. "cycles_devices"
+# sets up the GPU, workers started with --factory-startup only know the CPU.
+# A single line "BAKELAB_STATUS {...}" is printed and the process exits with
+# 0 on success, 1 if the bake failed and 2 if the job could not be read.
+
+import os
+import sys
+import json
+import time
+import bpy
+
+EXIT_FINISHED = 0
+EXIT_FAILED   = 1
+EXIT_INVALID  = 2
+
+class JobError(Exception):
+    pass
+
+def LoadJob(filepath):
+    try:
+        with open(filepath, 'r') as file:
+            job = json.load(file)
+    except (OSError, ValueError) as error:
+        raise JobError("Couldn't read job file: " + str(error))
+    if not isinstance(job, dict):
+        raise JobError('Job must be a JSON object')
+    return job
+
+def SetProperties(target, values, what):
+    for key, value in values.items():
+        if key not in target.bl_rna.properties:
+            raise JobError('Unknown ' + what + ' property: ' + key)
+        try:
+            setattr(target, key, value)
+        except (TypeError, ValueError, AttributeError) as error:
+            raise JobError('Invalid ' + what + ' property ' + key + ': ' + str(error))
+
+def SetupCyclesDevices(context, cycles_devices):
+    # Returns a warning when none of the devices is found
+    addon = context.preferences.addons.get('cycles')
+    if addon is None:
+        return 'Cycles is not enabled, baking on the CPU'
+    cycles_prefs = addon.preferences
+    try:
+        cycles_prefs.compute_device_type = cycles_devices.get('type', 'NONE')
+    except TypeError:
+        return 'Unknown compute device type ' + str(cycles_devices.get('type')) + ', baking on the CPU'
+    if hasattr(cycles_prefs, 'refresh_devices'):
+        cycles_prefs.refresh_devices()
+    else: # Before 3.0
+        cycles_prefs.get_devices()
+    enabled = 0
+    for device in cycles_prefs.devices:
+        device.use = device.id in cycles_devices.get('devices', [])
+        if device.use and device.type != 'CPU':
+            enabled += 1
+    if enabled == 0:
+        return 'No GPU device found, baking on the CPU'
+    return None
+
+def SetupScene(context, job):
+    # Imported here, this file is also run directly as a script
+    from .bakelab_map import SetMapDefaults
+    scene = context.scene
+    props = scene.BakeLabProps
+
+    SetProperties(props, job.get('properties', {}), 'BakeLab')
+    if job.get('output_dir'):
+        props.save_or_pack = 'SAVE'
+        props.save_path = bpy.path.abspath(job['output_dir'])
+    else:
+        props.save_or_pack = 'PACK' # Kept in the blend, see "save_blend"
+    if job.get('threads'):
+        scene.render.threads_mode = 'FIXED'
+        scene.render.threads = job['threads']
+    warning = None
+    if props.compute_device == 'GPU':
+        warning = SetupCyclesDevices(context, job.get('cycles_devices', {}))
+        if warning is not None:
+            print('BakeLab: ' + warning)
+
+    # Maps {
+    if len(job.get('maps', [])) == 0:
+        raise JobError('Job has no maps')
+    scene.BakeLabMaps.clear()
+    for map_spec in job['maps']:
+        item = scene.BakeLabMaps.add()
+        item.type = map_spec.get('type', 'Albedo')
+        SetMapDefaults(item, item.type)
+        SetProperties(item, map_spec, 'map')
+    # }
+
+    # Selection {
+    objects = []
+    for name in job.get('objects', []):
+        obj = scene.objects.get(name)
+        if obj is None:
+            raise JobError('Object not found: ' + name)
+        objects.append(obj)
+    if len(objects) == 0:
+        raise JobError('Job has no objects')
+
+    active_object = objects[0]
+    if job.get('active_object'):
+        active_object = scene.objects.get(job['active_object'])
+        if active_object is None:
+            raise JobError('Object not found: ' + job['active_object'])
+
+    for obj in context.view_layer.objects:
+        obj.select_set(obj in objects)
+    active_object.select_set(True)
+    context.view_layer.objects.active = active_object
+    # }
+
+    scene.BakeLab_Data.clear()
+    props.bake_state = 'NONE'
+    return warning
+
+def CollectResults(context):
+    images = []
+    for data in context.scene.BakeLab_Data:
+        objects = [objData.obj.name for objData in data.obj_list if objData.obj]
+        for mapData in data.map_list:
+            image = mapData.image
+            if image is None or mapData.map_index < 0:
+                continue
+            images.append({
+                'constant' : list(mapData.constant_value) if mapData.is_constant else None,
+                'objects'  : objects,
+                'map_index': mapData.map_index, # Index into the job's "maps"
+                'type'     : mapData.bake_map.type,
+                'pass_name': mapData.bake_map.pass_name,
+                'image'    : image.name,
+                'filepath' : bpy.path.abspath(image.filepath) if image.filepath else '',
+                'packed'   : image.packed_file is not None,
+                'width'    : image.size[0],
+                'height'   : image.size[1]
+            })
+    return images
+
+def RunJob(context, job):
+    warning = SetupScene(context, job)
+
+    start_time = time.perf_counter()
+    message = ''
+    try:
+        result = bpy.ops.bakelab.bake('EXEC_DEFAULT')
+    except RuntimeError as error: # Raised for the errors the bake reports
+        result = {'CANCELLED'}
+        message = str(error).strip()
+    status = {
+        'status' : 'FINISHED' if result == {'FINISHED'} else 'FAILED',
+        'elapsed': time.perf_counter() - start_time,
+        'images' : CollectResults(context)
+    }
+    if message:
+        status['message'] = message
+    if warning is not None:
+        status['warning'] = warning
+    if job.get('save_blend'):
+        bpy.ops.wm.save_as_mainfile(filepath = bpy.path.abspath(job['save_blend']), copy = True)
+    return status
+
+def WriteStatus(status, status_file):
+    line = json.dumps(status)
+    print('BAKELAB_STATUS ' + line)
+    sys.stdout.flush()
+    if status_file:
+        with open(status_file, 'w') as file:
+            file.write(line)
+
+def main(argv = None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    if len(argv) == 0:
+        WriteStatus({'status': 'INVALID', 'message': 'No job file given'}, None)
+        sys.exit(EXIT_INVALID)
+
+    status_file = None
+    try:
+        job = LoadJob(argv[0])
+        status_file = job.get('status_file')
+        status = RunJob(bpy.context, job)
+    except JobError as error:
+        WriteStatus({'status': 'INVALID', 'message': str(error)}, status_file)
+        sys.exit(EXIT_INVALID)
+    except Exception as error: # The farm must see a failure, not a crash
+        WriteStatus({'status': 'FAILED', 'message': type(error).__name__ + ': ' + str(error)}, status_file)
+        sys.exit(EXIT_FAILED)
+
+    WriteStatus(status, status_file)
+    sys.exit(EXIT_FINISHED if status['status'] == 'FINISHED' else EXIT_FAILED)
+
+def _load_addon():
+    # Find (or register) the addon package this file belongs to
+    import importlib
+    addon_dir = os.path.normcase(os.path.dirname(os.path.abspath(__file__)))
+    for module in list(sys.modules.values()):
+        for path in getattr(module, '__path__', []):
+            if os.path.normcase(os.path.abspath(path)) == addon_dir:
+                return importlib.import_module(module.__name__ + '.bakelab_job')
+
+    sys.path.insert(0, os.path.dirname(addon_dir))
+    package = importlib.import_module(os.path.basename(addon_dir))
+    package.register()
+    return importlib.import_module(package.__name__ + '.bakelab_job')
+
+if __name__ == "__main__":
+    _load_addon().main()
@@ -166,6 +166,46 @@ class BakeLabMap(PropertyGroup):
                 description = 'Amount of Samples',
                 min = 1, soft_max = 1024
             )
+    progressive : BoolProperty(
+                name = 'Progressive',
+                description = 'Bake in sample steps and stop once the image is clean enough (Samples is the maximum)',
+                default = False
+            )
+    progressive_step : IntProperty(
+                name = 'Step Samples',
+                description = 'Samples baked per step, each step uses a new seed',
+                default = 8,
+                min = 1, soft_max = 256
+            )
+    noise_threshold : FloatProperty(
+                name = 'Noise Threshold',
+                description = 'Stop when 99% of texels have a standard error below this',
+                default = 0.01,
+                min = 0, max = 1,
+                precision = 3
+            )
+    time_limit : FloatProperty(
+                name = 'Time Limit',
+                description = 'Stop after this many seconds (0 = no limit)',
+                default = 0,
+                min = 0
+            )
+    denoise : BoolProperty(
+                name = 'Denoise',
+                description = 'Denoise the baked image with Open Image Denoise, baked albedo and normal maps are used as guides',
+                default = False
+            )
+    cycles_profile : EnumProperty(
+                name = 'Light Paths',
+                description = 'Cycles light path settings used while baking this map',
+                items =  (
+                    ('AUTO',    'Auto',         'Pick by map type and passes'),
+                    ('SURFACE', 'Surface',      'No bounces, for maps that read the surface only'),
+                    ('DIRECT',  'Direct Light', 'No indirect bounces'),
+                    ('SCENE',   'Scene',        'Light path settings of the scene')
+                ),
+                default = 'AUTO'
+            )
     
     normal_space : EnumProperty(
                 name = 'Normal Space',
@@ -191,6 +231,132 @@ class BakeLabMap(PropertyGroup):
 ################################################################
 ################################################################
 
+def SetMapDefaults(item, type):
+    if type == 'Albedo':
+        item.img_name = '*_t'
+        item.samples  = 4
+    if type == 'Combined':
+        item.img_name = '*_c'
+        item.samples  = 64
+    if type == 'Normal':
+        item.img_name = '*_n'
+        item.samples  = 16
+        item.color_space = 'Non-Color'
+        item.aa_override = 1 #Because cycles has buildin anti-aliasing for normals
+    if type == 'Displacement':
+        item.img_name = '*_h'
+        item.samples  = 4
+        item.color_space = 'Non-Color'
+    if type == 'AO':
+        item.img_name = '*_ao'
+        item.samples  = 64
+        item.color_space = 'Non-Color'
+    if type == 'Shadow':
+        item.img_name = '*_sh'
+        item.samples  = 32
+    if type == 'Glossy':
+        item.img_name = '*_s'
+        item.samples  = 8
+    if type == 'Roughness':
+        item.img_name = '*_r'
+        item.samples  = 4
+        item.color_space = 'Non-Color'
+    if type == 'Diffuse':
+        item.img_name = '*_d'
+        item.samples  = 8
+    if type == 'Emission':
+        item.img_name = '*_e'
+        item.samples  = 4
+    if type == 'Transmission':
+        item.img_name = '*_a'
+        item.samples  = 8
+    if type == 'UV':
+        item.img_name = '*_uv'
+        item.samples  = 1
+    if type == 'Environment':
+        item.img_name = '*_env'
+        item.samples  = 16
+    if type == 'Subsurface':
+        item.img_name = '*_sss'
+        item.samples  = 64
+    if type == 'CustomPass':
+        item.img_name = '*_pass'
+        item.samples  = 4
+        item.color_space = 'Non-Color'
+
+# Maps with lighting noise worth denoising
+DENOISE_MAPS = {
+    'AO', 'Combined', 'Shadow', 'Diffuse', 'Glossy', 'Transmission', 'Subsurface', 'Environment'
+}
+# Baked before the others so the denoiser can use them as guides
+DENOISE_GUIDE_MAPS = ('Albedo', 'Normal')
+
+# Cycles settings of each light path profile, the rest is kept from the scene
+CYCLES_PROFILES = {
+    'SURFACE': {
+        'max_bounces'            : 0,
+        'diffuse_bounces'        : 0,
+        'glossy_bounces'         : 0,
+        'transmission_bounces'   : 0,
+        'volume_bounces'         : 0,
+        'transparent_max_bounces': 0,
+        'caustics_reflective'    : False,
+        'caustics_refractive'    : False,
+        'use_adaptive_sampling'  : False,
+        'use_light_tree'         : False
+    },
+    'DIRECT': {
+        'max_bounces'            : 0,
+        'diffuse_bounces'        : 0,
+        'glossy_bounces'         : 0,
+        'transmission_bounces'   : 0,
+        'volume_bounces'         : 0,
+        'caustics_reflective'    : False,
+        'caustics_refractive'    : False
+    },
+    'SCENE': {}
+}
+CYCLES_PROFILE_SETTINGS = set(CYCLES_PROFILES['SURFACE']) | set(CYCLES_PROFILES['DIRECT'])
+
+def MapProfile(item):
+    if item.cycles_profile != 'AUTO':
+        return item.cycles_profile
+    if item.type in {'Albedo', 'Displacement', 'CustomPass', 'Emission', 'UV', 'Normal', 'Roughness'}:
+        return 'SURFACE'
+    if item.type in {'AO', 'Shadow'}:
+        return 'DIRECT'
+    if item.type == 'Combined':
+        return 'SCENE' if item.combined_indirect else 'DIRECT'
+    if item.type in {'Diffuse', 'Glossy', 'Transmission', 'Subsurface'}:
+        if item.bake_indirect:
+            return 'SCENE'
+        return 'DIRECT' if item.bake_direct else 'SURFACE'
+    return 'SCENE'
+
+def ImageExtension(item):
+    if item.file_format == 'PNG':
+        return '.png'
+    if item.file_format == 'JPEG':
+        return '.jpg'
+    if item.file_format == 'OPEN_EXR':
+        return '.exr'
+    return '.'
+
+def MapIndex(item):
+    # Position in the scene's map list, -1 for maps that are not in it
+    for index, scene_item in enumerate(item.id_data.BakeLabMaps):
+        if scene_item == item:
+            return index
+    return -1
+
+def MapToDict(item):
+    values = {}
+    for prop in item.bl_rna.properties:
+        if prop.is_readonly:
+            continue
+        values[prop.identifier] = getattr(item, prop.identifier)
+    return values
+
 class BakeLabAddMapItem(bpy.types.Operator):
     """Add a new bake map"""
     bl_idname = "bakelab.newmapitem"
@@ -310,57 +476,7 @@ class BakeLabAddMapItem(bpy.types.Operator):
             )
                     
     def calcItemSettings(self,context,item):
-        if self.type == 'Albedo':
-            item.img_name = '*_t'
-            item.samples  = 4
-        if self.type == 'Combined':
-            item.img_name = '*_c'
-            item.samples  = 64
-        if self.type == 'Normal':
-            item.img_name = '*_n'
-            item.samples  = 16
-            item.color_space = 'Non-Color'
-            item.aa_override = 1 #Because cycles has buildin anti-aliasing for normals
-        if self.type == 'Displacement':
-            item.img_name = '*_h'
-            item.samples  = 4
-            item.color_space = 'Non-Color'
-        if self.type == 'AO':
-            item.img_name = '*_ao'
-            item.samples  = 64
-            item.color_space = 'Non-Color'
-        if self.type == 'Shadow':
-            item.img_name = '*_sh'
-            item.samples  = 32
-        if self.type == 'Glossy':
-            item.img_name = '*_s'
-            item.samples  = 8
-        if self.type == 'Roughness':
-            item.img_name = '*_r'
-            item.samples  = 4
-            item.color_space = 'Non-Color'
-        if self.type == 'Diffuse':
-            item.img_name = '*_d'
-            item.samples  = 8
-        if self.type == 'Emission':
-            item.img_name = '*_e'
-            item.samples  = 4
-        if self.type == 'Transmission':
-            item.img_name = '*_a'
-            item.samples  = 8
-        if self.type == 'UV':
-            item.img_name = '*_uv'
-            item.samples  = 1
-        if self.type == 'Environment':
-            item.img_name = '*_env'
-            item.samples  = 16
-        if self.type == 'Subsurface':
-            item.img_name = '*_sss'
-            item.samples  = 64
-        if self.type == 'CustomPass':
-            item.img_name = '*_pass'
-            item.samples  = 4
-            item.color_space = 'Non-Color'
+        SetMapDefaults(item, self.type)
     
     def draw(self,context):
         layout = self.layout
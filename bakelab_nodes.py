@@ -0,0 +1,221 @@
+# Copyable attributes of each node type, built once from its RNA
+NODE_ATTRIBUTES = {}
+IGNORED_ATTRIBUTES = {'name', 'parent', 'select'}
+
+def node_attributes(node):
+    attributes = NODE_ATTRIBUTES.get(node.bl_idname)
+    if attributes is None:
+        attributes = [
+            prop.identifier for prop in node.bl_rna.properties
+            if not prop.is_readonly
+            and prop.type != 'COLLECTION'
+            and prop.identifier not in IGNORED_ATTRIBUTES
+            and not prop.identifier.startswith('bl_')
+        ]
+        NODE_ATTRIBUTES[node.bl_idname] = attributes
+    return attributes
+
+def sockets_by_identifier(sockets):
+    return {socket.identifier: socket for socket in sockets}
+
+def copy_default(src_socket, dst_socket):
+    if hasattr(src_socket, 'default_value') and hasattr(dst_socket, 'default_value'):
+        try:
+            dst_socket.default_value = src_socket.default_value
+        except (TypeError, ValueError, AttributeError):
+            pass # Sockets of different types
+
+def copy_node(dst_nodes, node):
+    try:
+        new_node = dst_nodes.new(type = node.bl_idname)
+    except RuntimeError:
+        return None
+    for attribute in node_attributes(node):
+        try:
+            value = getattr(node, attribute)
+            if value is None:
+                continue
+            setattr(new_node, attribute, value)
+        except (TypeError, ValueError, AttributeError, RuntimeError):
+            pass
+    dst_inputs = sockets_by_identifier(new_node.inputs)
+    for src_input in node.inputs:
+        dst_input = dst_inputs.get(src_input.identifier)
+        if dst_input is not None:
+            copy_default(src_input, dst_input)
+    return new_node
+
+def socket_at(sockets, index, identifier):
+    # sockets: per node dicts by identifier, None for nodes that couldn't be copied
+    if sockets[index] is None:
+        return None
+    return sockets[index].get(identifier)
+
+def linked_socket(socket):
+    for link in socket.links:
+        if link.is_valid and not link.is_muted:
+            return link.from_socket
+    return None
+
+def group_output_node(nodes):
+    outputs = [node for node in nodes if node.type == 'GROUP_OUTPUT']
+    for node in outputs:
+        if node.is_active_output:
+            return node
+    return outputs[0] if outputs else None
+
+class FlatGroup:
+    """A node group with its nested groups expanded into plain nodes"""
+    def __init__(self):
+        self.nodes    = [] # Source nodes, from the group or from nested groups
+        self.links    = [] # (from node index, output identifier, to node index, input identifier)
+        self.inputs   = {} # Group input identifier: [(node index, input identifier)]
+        self.outputs  = {} # Group output identifier: ('NODE', index, identifier) or ('INPUT', identifier)
+        self.defaults = [] # (node index, input identifier, socket) set from unlinked nested group inputs
+
+class NodeFlattener:
+    """Expands node groups into material trees, each group is flattened once per bake"""
+    def __init__(self):
+        self.groups = {}
+
+    def group_key(self, node_tree):
+        # No public update counter, groups don't change while baking
+        return getattr(node_tree, 'session_uid', None) or node_tree.name_full
+
+    def Group(self, node_tree):
+        key = self.group_key(node_tree)
+        if key not in self.groups:
+            self.groups[key] = self.flatten_group(node_tree)
+        return self.groups[key]
+
+    def nested_group(self, node):
+        if node.type == 'GROUP' and node.node_tree is not None:
+            return self.Group(node.node_tree)
+        return None
+
+    def flatten_group(self, node_tree):
+        nodes = node_tree.nodes
+        group_out = group_output_node(nodes)
+        if group_out is None:
+            return None
+
+        flat = FlatGroup()
+        indices = {} # Node name: index of the plain node or offset of the nested group
+        nested  = {} # Node name: FlatGroup
+        for node in nodes:
+            if node.type in {'GROUP_INPUT', 'GROUP_OUTPUT', 'FRAME'}:
+                continue
+            group = self.nested_group(node)
+            indices[node.name] = len(flat.nodes)
+            if group is None:
+                flat.nodes.append(node)
+                continue
+            nested[node.name] = group
+            offset = len(flat.nodes)
+            flat.nodes.extend(group.nodes)
+            flat.links.extend((a + offset, x, b + offset, y) for a, x, b, y in group.links)
+            flat.defaults.extend((a + offset, x, s) for a, x, s in group.defaults)
+
+        def source_of_output(node, identifier):
+            if node.type == 'GROUP_INPUT':
+                return ('INPUT', identifier)
+            if node.name not in indices:
+                return None
+            group = nested.get(node.name)
+            if group is None:
+                return ('NODE', indices[node.name], identifier)
+            source = group.outputs.get(identifier)
+            if source is None:
+                return None
+            if source[0] == 'INPUT': # Passed straight through the nested group
+                return source_of_input(node, source[1])
+            return ('NODE', source[1] + indices[node.name], source[2])
+
+        def source_of_input(node, identifier):
+            for socket in node.inputs:
+                if socket.identifier == identifier:
+                    from_socket = linked_socket(socket)
+                    if from_socket is None:
+                        return None
+                    return source_of_output(from_socket.node, from_socket.identifier)
+            return None
+
+        def connect(source, index, identifier):
+            if source[0] == 'INPUT':
+                flat.inputs.setdefault(source[1], []).append((index, identifier))
+            else:
+                flat.links.append((source[1], source[2], index, identifier))
+
+        for node in nodes:
+            if node.name not in indices:
+                continue
+            group = nested.get(node.name)
+            for socket in node.inputs:
+                source = source_of_input(node, socket.identifier)
+                if group is None:
+                    if source is not None:
+                        connect(source, indices[node.name], socket.identifier)
+                    continue
+                for a, x in group.inputs.get(socket.identifier, []):
+                    if source is None:
+                        flat.defaults.append((a + indices[node.name], x, socket))
+                    else:
+                        connect(source, a + indices[node.name], x)
+
+        for socket in group_out.inputs:
+            source = source_of_input(group_out, socket.identifier)
+            if source is not None:
+                flat.outputs[socket.identifier] = source
+        return flat
+
+    def Flatten(self, node_tree):
+        nodes = node_tree.nodes
+        links = node_tree.links
+        for group_node in [node for node in nodes if node.type == 'GROUP']:
+            group = self.nested_group(group_node)
+            if group is None:
+                continue
+
+            new_nodes = [copy_node(nodes, node) for node in group.nodes]
+            new_inputs  = [node and sockets_by_identifier(node.inputs)  for node in new_nodes]
+            new_outputs = [node and sockets_by_identifier(node.outputs) for node in new_nodes]
+
+            for a, x, b, y in group.links:
+                from_socket = socket_at(new_outputs, a, x)
+                to_socket = socket_at(new_inputs, b, y)
+                if from_socket is not None and to_socket is not None:
+                    links.new(from_socket, to_socket)
+            for a, x, socket in group.defaults:
+                to_socket = socket_at(new_inputs, a, x)
+                if to_socket is not None:
+                    copy_default(socket, to_socket)
+
+            group_inputs = sockets_by_identifier(group_node.inputs)
+            for identifier, targets in group.inputs.items():
+                group_input = group_inputs.get(identifier)
+                if group_input is None:
+                    continue
+                from_socket = linked_socket(group_input)
+                for a, x in targets:
+                    to_socket = socket_at(new_inputs, a, x)
+                    if to_socket is None:
+                        continue
+                    copy_default(group_input, to_socket)
+                    if from_socket is not None:
+                        links.new(from_socket, to_socket)
+
+            for group_output in group_node.outputs:
+                source = group.outputs.get(group_output.identifier)
+                if source is None:
+                    continue
+                if source[0] == 'INPUT':
+                    group_input = group_inputs.get(source[1])
+                    from_socket = group_input and linked_socket(group_input)
+                else:
+                    from_socket = socket_at(new_outputs, source[1], source[2])
+                if from_socket is None:
+                    continue
+                for to_socket in [link.to_socket for link in group_output.links]:
+                    links.new(from_socket, to_socket)
+
+            nodes.remove(group_node)
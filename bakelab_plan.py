@@ -0,0 +1,691 @@
+import os
+import bpy
+import numpy as np
+from bpy.types import (
+            Operator
+        )
+from math import log2, sqrt
+
+from .bakelab_tools import (
+    SplitPassNames,
+    PassInputs,
+    ActiveMaterialOutput,
+    IsValidMesh,
+    RenderUVLayer
+)
+from .bakelab_map import (
+    ImageExtension,
+    DENOISE_MAPS,
+    DENOISE_GUIDE_MAPS
+)
+from .bakelab_hash import (
+    HASH_KEY,
+    NAME_KEY,
+    HashCache,
+    JobHash,
+    MaterialReadsWorld,
+    ModifierSignature
+)
+from .bakelab_cache import (
+    IsCacheable,
+    OpenBakeCache
+)
+from .bakelab_history import (
+    DeviceKey,
+    OpenBakeHistory
+)
+
+def ImageBytes(width, height, float_depth):
+    # Blender keeps RGBA buffers, 4 bytes per pixel or 4 floats per pixel
+    if float_depth:
+        return width * height * 16
+    return width * height * 4
+
+def FormatBytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024
+    return '%.1f TB' % size
+
+def FormatCount(count):
+    for unit in ('', ' K', ' M', ' G'):
+        if count < 1000:
+            return '%.1f%s' % (count, unit)
+        count /= 1000
+    return '%.1f T' % count
+
+def FormatSeconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return str(seconds) + 's'
+    if seconds < 3600:
+        return '%dm %02ds' % (seconds // 60, seconds % 60)
+    return '%dh %02dm' % (seconds // 3600, seconds % 3600 // 60)
+
+class BakeJob:
+    def __init__(self, map, targets, sources, name, data):
+        self.map     = map     # BakeLabMap
+        self.targets = targets # Objects that receive the image
+        self.sources = sources # Objects that are baked from (same list unless selected to active)
+        self.name    = name    # Replaces '*' in the image name
+        self.data    = data    # BakeLab_Data entry index
+        self.width   = 0
+        self.height  = 0
+        self.aa      = 1
+        self.image   = None
+        self.hash    = None
+        self.reuse   = False # Image from the last bake is still valid
+        self.cache_path = None # Image file found in the bake cache
+        self.constant = None   # Color of a pass that needs no bake
+        self.channels = None   # Jobs baked into the R, G and B of this job's image
+        self.tiles    = None   # (columns, rows) when baked a tile at a time
+        self.accumulate = False # Anti-aliasing by jittered passes at the final size
+        self.shared   = None   # Job of an identical object whose image is used instead
+        self.crop     = None   # (u, v, width, height) of the UV space the image covers, None = all of it
+        self.triangles = 0     # Evaluated triangles of the targets and sources
+        self.seconds  = None   # Bake time predicted from past bakes
+
+    def image_name(self):
+        return self.map.img_name.replace('*', self.name)
+
+    def uv_rect(self):
+        if self.crop is None:
+            return np.zeros(2, dtype = np.float32), np.ones(2, dtype = np.float32)
+        return np.array(self.crop[:2], dtype = np.float32), np.array(self.crop[2:], dtype = np.float32)
+
+    def bake_pixels(self):
+        return self.width * self.aa * self.height * self.aa
+
+    def bake_scale(self):
+        # Size of the baked image relative to the final image
+        return 1 if self.accumulate else self.aa
+
+    def cost(self):
+        if self.channels:
+            return self.bake_pixels() * max(job.map.samples for job in self.channels)
+        return self.bake_pixels() * self.map.samples
+
+    def bake_bytes(self):
+        if self.channels:
+            return sum(job.bake_bytes() for job in self.channels)
+        # Accumulated passes keep a float mean, variance and read buffer per pixel
+        accumulator_bytes = 44 if self.accumulate else 0
+        if self.tiles:
+            # One tile image plus the float buffer the tiles are gathered in
+            tile_width  = -(-self.width  // self.tiles[0]) * self.bake_scale()
+            tile_height = -(-self.height // self.tiles[1]) * self.bake_scale()
+            return (
+                ImageBytes(tile_width, tile_height, self.map.float_depth) +
+                tile_width * tile_height * accumulator_bytes +
+                ImageBytes(self.width, self.height, True)
+            )
+        if self.accumulate:
+            return self.width * self.height * accumulator_bytes
+        return ImageBytes(self.width * self.aa, self.height * self.aa, self.map.float_depth)
+
+    def image_bytes(self):
+        if self.channels:
+            return sum(job.image_bytes() for job in self.channels)
+        return ImageBytes(self.width, self.height, self.map.float_depth)
+
+    def prepared_bytes(self):
+        # Image created before baking, packed right away unless buffers are freed
+        if self.channels:
+            return sum(job.prepared_bytes() for job in self.channels)
+        scale = 1 if self.tiles else self.bake_scale()
+        return ImageBytes(self.width * scale, self.height * scale, self.map.float_depth)
+
+class BakePlan:
+    def __init__(self):
+        self.selected_objects = []
+        self.active_object = None
+        self.maps     = []  # Enabled BakeLabMaps
+        self.data     = []  # Object lists of BakeLab_Data entries
+        self.jobs     = []
+        self.errors   = []
+        self.warnings = []
+        self.pack     = False # Images are packed, the packed files stay in memory too
+        self.free_buffers = False # Pack late and free image buffers once packed
+        self.merged_mesh_bytes = 0
+        self.coverages = {} # Object: SurfaceCoverage, adaptive sizes only
+
+    def report(self, type, message):
+        if 'ERROR' in type:
+            self.errors.append(message)
+        else:
+            self.warnings.append(message)
+
+    def map_jobs(self, map):
+        return [job for job in self.jobs if job.map == map]
+
+    def bake_jobs(self):
+        return [job for job in self.jobs if not job.reuse and not job.cache_path and not job.shared]
+
+    def shared_jobs(self):
+        return [job for job in self.jobs if job.shared]
+
+    def total_cost(self):
+        return sum(job.cost() for job in self.bake_jobs())
+
+    def total_seconds(self):
+        jobs = self.bake_jobs()
+        if any(job.seconds is None for job in jobs):
+            return None
+        return sum(job.seconds for job in jobs)
+
+    def job_weights(self):
+        # Predicted seconds, samples when some job has no prediction
+        jobs = self.bake_jobs()
+        if self.total_seconds() is None:
+            return {job: job.cost() for job in jobs}
+        return {job: job.seconds for job in jobs}
+
+    def peak_memory(self):
+        # Finished images and their packed files, plus the largest set of bake buffers alive at once
+        resident = self.merged_mesh_bytes
+        for job in self.jobs:
+            if job.shared:
+                continue
+            if not (self.free_buffers and self.pack):
+                resident += job.image_bytes()
+            if self.pack:
+                resident += job.image_bytes() # Compressed files, counted at their worst
+        bake_bytes = {}
+        for job in self.bake_jobs():
+            size = job.bake_bytes()
+            if self.pack and not self.free_buffers:
+                size += job.prepared_bytes()
+            bake_bytes[job.map] = bake_bytes.get(job.map, 0) + size
+        return resident + max(bake_bytes.values(), default = 0)
+
+    def Display(self, props):
+        props.plan_job_count = len(self.bake_jobs())
+        props.plan_error = self.errors[0] if self.errors else ""
+        props.plan_cost = FormatCount(self.total_cost()) + ' samples'
+        props.plan_memory = FormatBytes(self.peak_memory())
+        seconds = self.total_seconds()
+        props.plan_time = FormatSeconds(seconds) if seconds is not None else ""
+        props.plan_uv_coverage = ""
+        if self.coverages:
+            utilizations = {obj: coverage.utilization() for obj, coverage in self.coverages.items()}
+            lowest = min(utilizations, key = utilizations.get)
+            props.plan_uv_coverage = '%d%%' % round(sum(utilizations.values()) / len(utilizations) * 100)
+            if len(utilizations) > 1:
+                props.plan_uv_coverage += ', lowest %d%% %s' % (round(utilizations[lowest] * 100), lowest.name)
+
+class SurfaceCoverage:
+    """World space area of objects, and the area and bounds of their UVs"""
+    def __init__(self):
+        self.world_area = 0.0
+        self.uv_area = 0.0
+        self.uv_min = np.full(2, np.inf)
+        self.uv_max = np.full(2, -np.inf)
+
+    def add(self, other):
+        self.world_area += other.world_area
+        self.uv_area += other.uv_area
+        self.uv_min = np.minimum(self.uv_min, other.uv_min)
+        self.uv_max = np.maximum(self.uv_max, other.uv_max)
+
+    def utilization(self):
+        # Part of the 0..1 UV space covered, overlapping islands can't cover more than all of it
+        return min(self.uv_area, 1.0)
+
+    def image_side(self, texel_per_unit):
+        # Image side giving texel_per_unit texels per world unit where the UVs are
+        uv_area = self.uv_area
+        if uv_area < 1e-8: # Collapsed UVs, size by the world area alone
+            uv_area = 1.0
+        return sqrt(self.world_area / uv_area) * texel_per_unit
+
+    def bounds(self):
+        low  = np.clip(self.uv_min, 0, 1)
+        high = np.clip(self.uv_max, 0, 1)
+        if np.any(high <= low):
+            return None
+        return low, high
+
+def calc_surface_coverage(obj, depsgraph):
+    # Areas of the evaluated mesh, modifiers included
+    obj_eval = obj.evaluated_get(depsgraph)
+    mesh = obj_eval.to_mesh()
+    mesh.calc_loop_triangles()
+    co = np.empty(len(mesh.vertices) * 3, dtype = np.float32)
+    triangles = np.empty(len(mesh.loop_triangles) * 3, dtype = np.int32)
+    triangle_loops = np.empty(len(mesh.loop_triangles) * 3, dtype = np.int32)
+    mesh.vertices.foreach_get('co', co)
+    mesh.loop_triangles.foreach_get('vertices', triangles)
+    mesh.loop_triangles.foreach_get('loops', triangle_loops)
+    uv_layer = RenderUVLayer(mesh)
+    uvs = None
+    if uv_layer is not None:
+        uvs = np.empty(len(mesh.loops) * 2, dtype = np.float32)
+        uv_layer.data.foreach_get('uv', uvs)
+    obj_eval.to_mesh_clear()
+
+    coverage = SurfaceCoverage()
+    matrix = np.array(obj_eval.matrix_world, dtype = np.float64)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T # Translation doesn't change the area
+    corners = co[triangles.reshape(-1, 3)]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    coverage.world_area = float(np.linalg.norm(cross, axis = 1).sum() * 0.5)
+
+    if uvs is not None and len(triangle_loops):
+        corners = uvs.reshape(-1, 2)[triangle_loops.reshape(-1, 3)].astype(np.float64)
+        edge_1 = corners[:, 1] - corners[:, 0]
+        edge_2 = corners[:, 2] - corners[:, 0]
+        coverage.uv_area = float(np.abs(edge_1[:, 0] * edge_2[:, 1] - edge_1[:, 1] * edge_2[:, 0]).sum() * 0.5)
+        coverage.uv_min = corners.reshape(-1, 2).min(axis = 0)
+        coverage.uv_max = corners.reshape(-1, 2).max(axis = 0)
+    return coverage
+
+class SurfaceCoverages:
+    """Surface coverages computed once per plan, shared by objects with the same mesh and scale"""
+    def __init__(self, depsgraph):
+        self.depsgraph = depsgraph
+        self.coverages = {}
+
+    def key(self, obj):
+        modifiers = ModifierSignature(obj)
+        if modifiers is None:
+            return obj
+        # Rotation keeps the area, only the metric of the matrix matters
+        matrix = np.array(obj.matrix_world, dtype = np.float64)[:3, :3]
+        metric = np.round(matrix.T @ matrix, 6)
+        return (obj.data, modifiers, tuple(metric.ravel()))
+
+    def coverage(self, obj):
+        key = self.key(obj)
+        if key not in self.coverages:
+            self.coverages[key] = calc_surface_coverage(obj, self.depsgraph)
+        return self.coverages[key]
+
+def round_to_power_of_2(num):
+    return pow(2,round(log2(num)))
+
+def fit_image_size(props, width, height, keep_min_size):
+    # Scaled as a whole so texels stay square
+    scale = 1.0
+    if max(width, height) > props.image_max_size:
+        scale = props.image_max_size / max(width, height)
+    elif min(width, height) < props.image_min_size:
+        scale = min(props.image_min_size / min(width, height), props.image_max_size / max(width, height))
+    min_size = props.image_min_size if keep_min_size else 1
+    sizes = []
+    for size in (max(width * scale, 1), max(height * scale, 1)):
+        if props.round_adaptive_image:
+            size = round_to_power_of_2(size)
+        sizes.append(min(max(int(round(size)), min_size), props.image_max_size))
+    return sizes
+
+def CalcImageSize(props, map, coverage, can_crop = True):
+    # Width, height and the UV rectangle the image covers
+    if props.image_size == 'FIXED':
+        return map.width, map.height, None
+    side = max(coverage.image_side(props.texel_per_unit) * map.image_scale, 1)
+    bounds = coverage.bounds() if props.crop_uv_bounds and can_crop else None
+    if bounds is None:
+        width, height = fit_image_size(props, side, side, True)
+        return width, height, None
+    
+    # Room for the bake margin around the islands
+    low, high = bounds
+    low  = np.maximum(low  - props.bake_margin / side, 0)
+    high = np.minimum(high + props.bake_margin / side, 1)
+    size = high - low
+    width, height = fit_image_size(props, side * size[0], side * size[1], False)
+    return width, height, (float(low[0]), float(low[1]), float(size[0]), float(size[1]))
+
+def TriangleCount(obj, depsgraph):
+    # Loop triangles without computing them, a polygon of n loops has n - 2
+    mesh = obj.evaluated_get(depsgraph).data
+    return len(mesh.loops) - 2 * len(mesh.polygons)
+
+def CountTriangles(context, plan):
+    depsgraph = context.evaluated_depsgraph_get()
+    counts = {}
+    for job in plan.jobs:
+        for obj in set(job.targets + job.sources):
+            if obj not in counts:
+                counts[obj] = TriangleCount(obj, depsgraph)
+            job.triangles += counts[obj]
+
+def EstimateTimes(plan, history, device):
+    for job in plan.bake_jobs():
+        job.seconds = history.Predict(device, job.map.type, job.cost(), job.triangles)
+
+def CheckUVs(plan, objs):
+    for obj in objs:
+        if len(obj.data.uv_layers) == 0:
+            plan.report({'ERROR'}, 'Not all objects have UV maps')
+            return False
+    return True
+
+def image_has_pixels(image):
+    if image.packed_file is not None or image.has_data:
+        return True
+    return image.source == 'FILE' and os.path.exists(bpy.path.abspath(image.filepath))
+
+def HashJobs(context, plan):
+    props = context.scene.BakeLabProps
+    # Instances of an asset share cache entries wherever they are placed,
+    # unless objects are baked onto each other or joined
+    world_space = props.bake_mode == 'TO_ACTIVE' or (props.bake_mode == 'ALL_TO_ONE' and props.pre_join_mesh)
+    cache = HashCache(context.evaluated_depsgraph_get(), world_space)
+    for job in plan.jobs:
+        job.hash = JobHash(job, props, cache)
+
+def FindUnchangedJobs(plan):
+    baked_images = {}
+    for image in bpy.data.images:
+        if HASH_KEY in image and NAME_KEY in image:
+            baked_images[(image[HASH_KEY], image[NAME_KEY])] = image
+
+    for job in plan.jobs:
+        # The hash doesn't see lights, the world or other objects, lit maps are always baked again
+        if not IsCacheable(job.map):
+            continue
+        image = baked_images.get((job.hash, job.image_name()))
+        if image is not None and image_has_pixels(image):
+            job.image = image
+            job.reuse = True
+
+def FindCachedJobs(plan, bake_cache):
+    for job in plan.jobs:
+        if not job.reuse and IsCacheable(job.map):
+            job.cache_path = bake_cache.Find(job.hash, ImageExtension(job.map))
+
+def ShareIdenticalJobs(plan):
+    # Linked duplicates with the same materials and modifiers bake to the same pixels,
+    # as long as the map does not see the rest of the scene
+    signatures = {}
+    leaders = {}
+    world_trees = {}
+    for job in plan.bake_jobs():
+        if not IsCacheable(job.map):
+            continue
+        obj = job.targets[0]
+        if obj not in signatures:
+            modifiers = ModifierSignature(obj)
+            signatures[obj] = None
+            materials = tuple(slot.material for slot in obj.material_slots)
+            if modifiers is not None and not any(MaterialReadsWorld(mat, world_trees) for mat in materials):
+                signatures[obj] = (obj.data, materials, modifiers)
+        if signatures[obj] is None:
+            continue
+        key = (signatures[obj], job.map, job.width, job.height, job.aa)
+        leader = leaders.setdefault(key, job)
+        if leader is not job:
+            job.shared = leader
+
+def scalar_material(mat, map):
+    # Every input the pass resolves to holds one value, colors would be cut to their red channel
+    if mat is None or not mat.use_nodes or mat.node_tree is None:
+        return True # Baked black
+    nodes = mat.node_tree.nodes
+    if map.deep_search and any(node.type == 'GROUP' for node in nodes):
+        return False # Resolved only once the groups are flattened
+    out = ActiveMaterialOutput(nodes)
+    if out is None:
+        return True
+    pass_inputs = PassInputs(out, SplitPassNames(map.pass_name))
+    return all(socket is None or socket.type == 'VALUE' for socket in pass_inputs)
+
+def IsScalarPass(job, scalar_materials):
+    # scalar_materials: (material, map) results shared by the jobs of a plan
+    map = job.map
+    if map.type != 'CustomPass' or map.color_space != 'Non-Color':
+        return False
+    for obj in job.sources:
+        for slot in obj.material_slots:
+            key = (slot.material, map)
+            if key not in scalar_materials:
+                scalar_materials[key] = scalar_material(slot.material, map)
+            if not scalar_materials[key]:
+                return False
+    return True
+
+def PackScalarJobs(plan):
+    # Up to three scalar passes of the same objects and image size share one emit bake
+    groups = {}
+    scalar_materials = {}
+    for job in plan.bake_jobs():
+        if not job.tiles and IsScalarPass(job, scalar_materials):
+            key = (
+                job.data, tuple(job.sources), job.width, job.height, job.aa,
+                job.accumulate, job.tiles, job.crop, job.map.float_depth
+            )
+            groups.setdefault(key, []).append(job)
+
+    packed_jobs = {}
+    for group in groups.values():
+        for i in range(0, len(group), 3):
+            channels = group[i:i + 3]
+            if len(channels) < 2:
+                continue
+            first = channels[0]
+            job = BakeJob(first.map, first.targets, first.sources, first.name, first.data)
+            job.width, job.height, job.aa = first.width, first.height, first.aa
+            job.accumulate = first.accumulate
+            job.crop = first.crop
+            job.triangles = first.triangles
+            job.channels = channels
+            for channel in channels:
+                packed_jobs[channel] = job
+
+    # Packed jobs take the place of their first channel
+    jobs = []
+    for job in plan.jobs:
+        packed = packed_jobs.get(job)
+        if packed is None:
+            jobs.append(job)
+        elif packed.channels[0] is job:
+            jobs.append(packed)
+    plan.jobs = jobs
+
+def MergedMeshBytes(context, objs):
+    # Evaluated copies joined into one mesh, the copies and the result are alive at once
+    depsgraph = context.evaluated_depsgraph_get()
+    size = 0
+    for obj in objs:
+        mesh = obj.evaluated_get(depsgraph).data
+        size += len(mesh.vertices) * 24
+        size += len(mesh.loops) * (8 + 8 * len(mesh.uv_layers))
+        size += len(mesh.polygons) * 16
+    return size * 2
+
+def FitMemoryBudget(plan, props, can_adapt):
+    budget = props.memory_budget * 1024 * 1024
+    if budget <= 0 or plan.peak_memory() <= budget:
+        return
+    if props.memory_strategy == 'ADAPT':
+        # Cheapest first: free finished images, then accumulate anti-aliasing, then tile
+        plan.free_buffers = True
+        jobs = sorted(plan.bake_jobs(), key = lambda job: job.bake_bytes(), reverse = True)
+        # Every job of a map switches together, batches of a map bake in one mode
+        map_jobs = {}
+        for job in jobs:
+            map_jobs.setdefault(job.map, []).append(job)
+        maps = sorted(map_jobs, key = lambda map: sum(job.bake_bytes() for job in map_jobs[map]), reverse = True)
+        for map in maps if can_adapt else []:
+            if plan.peak_memory() <= budget:
+                return
+            group = [job for job in map_jobs[map] if job.aa > 1 and not job.accumulate]
+            if group and all(free_uv_slot(job) is None for job in group):
+                for job in group:
+                    job.accumulate = True
+                    job.tiles = None
+        tile_size = props.tile_size
+        while can_adapt and tile_size >= 256 and plan.peak_memory() > budget:
+            for job in jobs:
+                scale = job.bake_scale()
+                tiles = (TileCount(job.width, scale, tile_size), TileCount(job.height, scale, tile_size))
+                if tiles[0] * tiles[1] > 1 and free_uv_slot(job) is None:
+                    job.tiles = tiles
+            tile_size //= 2
+        if plan.peak_memory() <= budget:
+            return
+    plan.report({'WARNING'},
+        'Estimated peak memory ' + FormatBytes(plan.peak_memory()) +
+        ' is over the budget of ' + FormatBytes(budget)
+    )
+
+def TileCount(size, aa, tile_size):
+    return max(1, -(-size * aa // tile_size))
+
+def free_uv_slot(job):
+    for obj in job.targets:
+        if len(obj.data.uv_layers) >= 8:
+            return obj
+    return None
+
+def HasFreeUVSlot(plan, job):
+    # Tiles and jittered passes move a temporary UV map
+    obj = free_uv_slot(job)
+    if obj is not None:
+        plan.report({'ERROR'}, 'Baking needs a free UV map slot on ' + obj.name)
+        return False
+    return True
+
+def AccumulateAA(plan):
+    for job in plan.bake_jobs():
+        if job.aa > 1:
+            if not HasFreeUVSlot(plan, job):
+                return
+            job.accumulate = True
+
+def SplitTiles(plan, tile_size):
+    for job in plan.bake_jobs():
+        scale = job.bake_scale()
+        tiles = (TileCount(job.width, scale, tile_size), TileCount(job.height, scale, tile_size))
+        if tiles[0] * tiles[1] == 1:
+            continue
+        if not HasFreeUVSlot(plan, job):
+            return
+        job.tiles = tiles
+
+def BuildPlan(context):
+    scene = context.scene
+    props = scene.BakeLabProps
+    plan = BakePlan()
+
+    # Check selection and maps {
+    if len(context.selected_objects) == 0:
+        plan.report({'ERROR'}, 'Select some objects')
+        return plan
+    plan.selected_objects = [obj for obj in context.selected_objects if IsValidMesh(plan, obj)]
+    plan.active_object = context.active_object
+    if len(plan.selected_objects) == 0:
+        plan.report({'ERROR'}, 'No valid objects selected, see console for more info')
+        return plan
+
+    plan.maps = [map for map in scene.BakeLabMaps if map.enabled]
+    if len(plan.maps) == 0:
+        plan.report({'ERROR'}, 'Add bake maps')
+        return plan
+    if any(map.denoise and map.type in DENOISE_MAPS for map in plan.maps):
+        plan.maps.sort(key = lambda map: map.type not in DENOISE_GUIDE_MAPS)
+    # }
+
+    selected_objects = plan.selected_objects
+    active_object = plan.active_object
+    ##########################################################################################
+    if props.bake_mode == "INDIVIDUAL":
+        if not CheckUVs(plan, selected_objects):
+            return plan
+        for obj in selected_objects:
+            plan.data.append([obj])
+            for map in plan.maps:
+                plan.jobs.append(BakeJob(map, [obj], [obj], obj.name, len(plan.data) - 1))
+    ##########################################################################################
+    elif props.bake_mode == "ALL_TO_ONE":
+        if not CheckUVs(plan, selected_objects):
+            return plan
+        plan.data.append(selected_objects)
+        for map in plan.maps:
+            plan.jobs.append(BakeJob(map, selected_objects, selected_objects, props.global_image_name, 0))
+    ##########################################################################################
+    elif props.bake_mode == "TO_ACTIVE":
+        if len(selected_objects) < 2:
+            plan.report({'ERROR'}, 'Select atleast two mesh objects')
+            return plan
+        if active_object is None or active_object.type != 'MESH':
+            plan.report({'ERROR'}, 'Active object is not mesh type')
+            return plan
+        if len(active_object.data.uv_layers) == 0:
+            plan.report({'ERROR'}, 'Active object does not have UV maps')
+            return plan
+        sources = [obj for obj in selected_objects if obj is not active_object]
+        plan.data.append([active_object])
+        for map in plan.maps:
+            plan.jobs.append(BakeJob(map, [active_object], sources, active_object.name, 0))
+    ##########################################################################################
+
+    # The per object atlas loop bakes straight into the whole image
+    per_object_atlas = props.bake_mode == 'ALL_TO_ONE' and not props.pre_join_mesh and not props.batch_bake
+
+    # Image sizes {
+    coverages = SurfaceCoverages(context.evaluated_depsgraph_get())
+    for job in plan.jobs:
+        coverage = SurfaceCoverage()
+        if props.image_size == 'ADAPTIVE':
+            for obj in job.targets:
+                plan.coverages[obj] = coverages.coverage(obj)
+                coverage.add(plan.coverages[obj])
+        job.width, job.height, job.crop = CalcImageSize(props, job.map, coverage, not per_object_atlas)
+        if job.crop is not None and not HasFreeUVSlot(plan, job): # Cropped bakes move a temporary UV map
+            return plan
+        job.aa = props.anti_alias
+        if job.map.aa_override > 0:
+            job.aa = job.map.aa_override
+    # }
+    CountTriangles(context, plan)
+
+    bake_cache = OpenBakeCache(props)
+    if props.use_bake_cache and bake_cache is None:
+        plan.report({'WARNING'}, 'Bake cache folder is not set')
+    if props.incremental_bake or bake_cache is not None:
+        HashJobs(context, plan)
+    if props.incremental_bake:
+        FindUnchangedJobs(plan)
+    if bake_cache is not None:
+        FindCachedJobs(plan, bake_cache)
+    if props.bake_mode == 'INDIVIDUAL' and props.share_identical:
+        ShareIdenticalJobs(plan)
+
+    if props.aa_mode == 'ACCUMULATE' and not per_object_atlas:
+        AccumulateAA(plan)
+    if props.tiled_bake and not per_object_atlas:
+        SplitTiles(plan, props.tile_size)
+
+    plan.pack = props.save_or_pack == 'PACK'
+    if props.bake_mode == 'ALL_TO_ONE' and props.pre_join_mesh:
+        plan.merged_mesh_bytes = MergedMeshBytes(context, plan.selected_objects)
+    if not props.use_bake_farm: # Workers plan their own jobs
+        FitMemoryBudget(plan, props, not per_object_atlas)
+
+    # Farm jobs are split by map and their workers don't pack, the per object atlas loop bakes one map at a time
+    if props.pack_scalar_passes and not props.use_bake_farm and not per_object_atlas:
+        PackScalarJobs(plan)
+
+    history = OpenBakeHistory(props)
+    if history is not None:
+        EstimateTimes(plan, history, DeviceKey(scene))
+        history.Close()
+    return plan
+
+class BakeLab_Plan(Operator):
+    """Check the bake settings and estimate its cost"""
+    bl_idname = "bakelab.plan"
+    bl_label = "Estimate"
+
+    def execute(self, context):
+        plan = BuildPlan(context)
+        plan.Display(context.scene.BakeLabProps)
+        for message in plan.warnings:
+            self.report(type = {'WARNING'}, message = message)
+        if plan.errors:
+            self.report(type = {'ERROR'}, message = plan.errors[0])
+            return {'CANCELLED'}
+        return {'FINISHED'}
@@ -12,9 +12,25 @@ from bpy.props import (
             CollectionProperty
         )
 from .bakelab_tools import (
-    SelectObject,
-    SelectObjects
+    MakeSingleUser,
+    AddMaterialSlot
 )
+from .bakelab_trace import TracedOperator
+
+def link_uv(nodes, links, uv_socket, img_node, data):
+    # Cropped images cover only the UV bounds of their objects
+    if not data.is_cropped:
+        links.new(uv_socket, img_node.inputs['Vector'])
+        return
+    u, v, width, height = data.uv_crop
+    mapping = nodes.new(type = 'ShaderNodeMapping')
+    mapping.hide = True
+    mapping.location = img_node.location[0] - 200, img_node.location[1]
+    mapping.inputs['Location'].default_value = (-u / width, -v / height, 0)
+    mapping.inputs['Scale'].default_value = (1 / width, 1 / height, 1)
+    img_node.extension = 'EXTEND'
+    links.new(uv_socket, mapping.inputs['Vector'])
+    links.new(mapping.outputs['Vector'], img_node.inputs['Vector'])
 
 class BakeLab_GenerateMaterials(Operator):
     """Generate materials based on baked datas"""
@@ -55,13 +71,16 @@ class BakeLab_GenerateMaterials(Operator):
                 continue
             self.baked_types.append(bake_map.type)
             
-            if bake_map.type == 'Albedo':
+            if bake_map.type == 'Albedo' and data.is_constant:
+                pbr.inputs['Base Color'].default_value = (*data.constant_value, 1)
+                pass_available = True
+            elif bake_map.type == 'Albedo':
                 imgNode = nodes.new(type = 'ShaderNodeTexImage')
                 imgNode.hide = True
                 imgNode.location = -1000,-100
                 imgNode.image = bake_image
                 links.new(imgNode.outputs['Color'], pbr.inputs['Base Color'])
-                links.new(uvm.outputs['UV'], imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
             if bake_map.type == 'Combined':
                 imgNode = nodes.new(type = 'ShaderNodeTexImage')
@@ -74,7 +93,7 @@ class BakeLab_GenerateMaterials(Operator):
                 EmitNode.hide = True
                 links.new(imgNode.outputs['Color'], EmitNode.inputs[0])
                 links.new(EmitNode.outputs[0], out.inputs[0])
-                links.new(uvm.outputs['UV'], imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
             if bake_map.type == 'Normal':
                 imgNode = nodes.new(type = 'ShaderNodeTexImage')
@@ -87,7 +106,7 @@ class BakeLab_GenerateMaterials(Operator):
                 nmNode.space = bake_map.normal_space
                 links.new(imgNode.outputs['Color'], nmNode.inputs['Color'])
                 links.new(nmNode.outputs['Normal'], pbr.inputs['Normal'])
-                links.new(uvm.outputs['UV'], imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
             if bake_map.type == 'AO':
                 out.location[0] += 250
@@ -107,7 +126,7 @@ class BakeLab_GenerateMaterials(Operator):
                 ao_dark.inputs[0].default_value = 0,0,0,0
                 ao_dark.inputs[1].default_value = 0
                 
-                links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 links.new(imgNode.outputs['Color'], reroute.inputs[0])
                 links.new(reroute.outputs[0], ao_mix.inputs[0])
                 links.new(ao_dark.outputs[0], ao_mix.inputs[1])
@@ -120,7 +139,7 @@ class BakeLab_GenerateMaterials(Operator):
                 imgNode.location = -1000, -200
                 imgNode.image = bake_image
                 links.new(imgNode.outputs['Color'],pbr.inputs['Specular IOR Level'])
-                links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
             if bake_map.type == 'Roughness':
                 imgNode = nodes.new(type = 'ShaderNodeTexImage')
@@ -128,7 +147,7 @@ class BakeLab_GenerateMaterials(Operator):
                 imgNode.location = -1000, -250
                 imgNode.image = bake_image
                 links.new(imgNode.outputs['Color'],pbr.inputs['Roughness'])
-                links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
             if bake_map.type == 'Transmission':
                 imgNode = nodes.new(type = 'ShaderNodeTexImage')
@@ -136,7 +155,7 @@ class BakeLab_GenerateMaterials(Operator):
                 imgNode.location = -1000, -900
                 imgNode.image = bake_image
                 links.new(imgNode.outputs['Color'],pbr.inputs['Transmission Weight'])
-                links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+                link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                 pass_available = True
                 
             ###### Custom Passes{
@@ -154,26 +173,35 @@ class BakeLab_GenerateMaterials(Operator):
                             break
                 # }
                 if pass_input:
-                    if len(pass_input.links) == 0:
+                    if len(pass_input.links) == 0 and data.is_constant:
+                        value = data.constant_value
+                        if   pass_input.type == 'RGBA':
+                            pass_input.default_value = (*value, 1)
+                        elif pass_input.type == 'VECTOR':
+                            pass_input.default_value = value
+                        elif pass_input.type == 'VALUE':
+                            pass_input.default_value = value[0]
+                    elif len(pass_input.links) == 0:
                         imgNode = nodes.new(type = 'ShaderNodeTexImage')
                         imgNode.hide = True
                         imgNode.location = -1400,node_y_shift
                         imgNode.image = bake_image
                         links.new(imgNode.outputs['Color'], pass_input)
-                        links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+                        link_uv(nodes, links, uvm.outputs['UV'], imgNode, data)
                         node_y_shift -= 100
                     pass_available = True
                 ####### }
             ###### }
         return pass_available
     
+    @TracedOperator('generate_materials')
     def execute(self, context):
         props = context.scene.BakeLabProps
-        active_obj = context.active_object
         selected_objects = context.selected_objects
         baked_data = context.scene.BakeLab_Data
         
         materials_created = False
+        materials = {} # Entries with the same images share one material
         for data in baked_data:
             if data == None:
                 continue
@@ -185,7 +213,17 @@ class BakeLab_GenerateMaterials(Operator):
             if len(data.obj_list) == 0:  # Just in case
                 continue
             
-            mat = self.generate_mat(data.map_list, name)
+            key = tuple(
+                (mapData.bake_map.type, mapData.bake_map.pass_name, mapData.image,
+                    tuple(mapData.constant_value) if mapData.is_constant else None)
+                for mapData in data.map_list if mapData.bake_map is not None
+            )
+            if key in materials:
+                mat = materials[key]
+            else:
+                with self.tracer.Stage('generate_material', name = name, maps = len(data.map_list)):
+                    mat = self.generate_mat(data.map_list, name)
+                materials[key] = mat
             if mat is None:
                 continue
             
@@ -203,14 +241,12 @@ class BakeLab_GenerateMaterials(Operator):
                     if obj not in selected_objects:
                         continue
                 
-                SelectObject(obj)
                 if props.make_single_user:
-                    bpy.ops.object.make_single_user(object=True, obdata=True)
+                    MakeSingleUser(obj)
                 if obj.data.uv_layers.active is not None:
                     obj.data.uv_layers.active.active_render = True
                 for slot in obj.material_slots:
                     slot.material = mat
-        SelectObjects(active_obj, selected_objects)
         
         if materials_created:
             return {'FINISHED'}
@@ -224,7 +260,7 @@ class BakeLab_ApplyAO(Operator):
     bl_label = "Apply AO"
     bl_options = {'REGISTER','UNDO'}
         
-    def add_ao(self, bake_image, mat):
+    def add_ao(self, mapData, mat):
         nodes = mat.node_tree.nodes
         links = mat.node_tree.links
         out = None
@@ -251,7 +287,7 @@ class BakeLab_ApplyAO(Operator):
         imgNode.hide = True
         imgNode.width = bsdf.width
         imgNode.location = bsdf.location[0], bsdf.location[1]+100
-        imgNode.image = bake_image
+        imgNode.image = mapData.image
         
         ao_mix = nodes.new(type = 'ShaderNodeMixShader')
         ao_mix.location = out.location[:]
@@ -264,15 +300,15 @@ class BakeLab_ApplyAO(Operator):
         ao_dark.inputs[0].default_value = 0,0,0,0
         ao_dark.inputs[1].default_value = 0
         
-        links.new(uvm.outputs['UV'],imgNode.inputs['Vector'])
+        link_uv(nodes, links, uvm.outputs['UV'], imgNode, mapData)
         links.new(imgNode.outputs['Color'], ao_mix.inputs[0])
         links.new(ao_dark.outputs[0], ao_mix.inputs[1])
         links.new(bsdf.outputs[0],    ao_mix.inputs[2])
         links.new(ao_mix.outputs[0],  out.inputs[0])
     
+    @TracedOperator('apply_ao')
     def execute(self, context):
         props = context.scene.BakeLabProps
-        active_obj = context.active_object
         selected_objects = context.selected_objects
         baked_data = context.scene.BakeLab_Data
         
@@ -294,15 +330,14 @@ class BakeLab_ApplyAO(Operator):
                         if obj not in selected_objects:
                             continue
                     
-                    SelectObject(obj)
                     if props.make_single_user:
-                        bpy.ops.object.make_single_user(object=True, obdata=True)
+                        MakeSingleUser(obj)
                     
                     if obj.data.uv_layers.active is not None:
                         obj.data.uv_layers.active.active_render = True
                     
                     if len(obj.material_slots) == 0:
-                        bpy.ops.object.material_slot_add()
+                        AddMaterialSlot(obj)
                     for slot in obj.material_slots:
                         if slot.material == None:
                             slot.material = bpy.data.materials.new(obj.name+'_AO')
@@ -311,11 +346,11 @@ class BakeLab_ApplyAO(Operator):
                             mat_name = slot.material.name
                             slot.material = slot.material.copy()
                             slot.material.name = mat_name + '_' + obj.name + '_AO'
-                        self.add_ao(mapData.image, slot.material)
+                        with self.tracer.Stage('add_ao', object = obj.name, material = slot.material.name):
+                            self.add_ao(mapData, slot.material)
                         materials_modified = True
                 break
         
-        SelectObjects(active_obj, selected_objects)
         if materials_modified:
             return {'FINISHED'}
         else:
@@ -336,6 +371,7 @@ class BakeLab_ApplyDisplace(Operator):
         mod.show_in_editmode = True
         mod.show_on_cage = True
     
+    @TracedOperator('apply_displace')
     def execute(self, context):
         props = context.scene.BakeLabProps
         baked_data = context.scene.BakeLab_Data
@@ -356,6 +392,12 @@ class BakeLab_ApplyDisplace(Operator):
                 tex = bpy.data.textures.new(name = name, type = 'IMAGE')
                 tex.intensity = 1.5
                 tex.image = mapData.image
+                if mapData.is_cropped:
+                    # Texture space 0..1 maps to the part of the image the UVs reach
+                    u, v, width, height = mapData.uv_crop
+                    tex.extension = 'EXTEND'
+                    tex.crop_min_x, tex.crop_max_x = -u / width,  (1 - u) / width
+                    tex.crop_min_y, tex.crop_max_y = -v / height, (1 - v) / height
                 
                 for objData in data.obj_list:
                     obj = objData.obj
@@ -365,7 +407,8 @@ class BakeLab_ApplyDisplace(Operator):
                         if not obj.select_get():
                             continue
                     
-                    self.add_displacement(tex, obj)
+                    with self.tracer.Stage('add_displacement', object = obj.name, texture = tex.name):
+                        self.add_displacement(tex, obj)
                     objects_modified = True
                 break
         
@@ -1,7 +1,10 @@
 import bpy
+import numpy as np
 
 def SelectObject(obj):
-    bpy.ops.object.select_all(action = 'DESELECT')
+    # Deselects only what is selected, select_all walks every object in the view layer
+    for selected_obj in bpy.context.selected_objects:
+        selected_obj.select_set(False)
     if obj:
         obj.select_set(True)
     bpy.context.view_layer.objects.active = obj
@@ -12,6 +15,68 @@ def SelectObjects(active_obj, selected_objs):
         if obj:
             obj.select_set(True)
             
+def ObjectContext(context, active_obj, selected_objs):
+    # Operators see these objects as selected, the view layer selection stays untouched
+    return context.temp_override(
+        object = active_obj,
+        active_object = active_obj,
+        selected_objects = selected_objs,
+        selected_editable_objects = selected_objs
+    )
+
+def MakeSingleUser(obj):
+    # Same as make_single_user(obdata = True) for one object, without selecting it
+    if obj.data is not None and obj.data.users > 1:
+        obj.data = obj.data.copy()
+
+def AddMaterialSlot(obj):
+    obj.data.materials.append(None)
+
+def RenderUVLayer(mesh):
+    for uv_layer in mesh.uv_layers:
+        if uv_layer.active_render:
+            return uv_layer
+    return mesh.uv_layers.active
+
+def CornerNormals(mesh):
+    # Shading normal of every face corner, flattened
+    normals = np.empty(len(mesh.loops) * 3, dtype = np.float32)
+    if hasattr(mesh, 'corner_normals'): # 4.1+
+        mesh.corner_normals.foreach_get('vector', normals)
+    else:
+        mesh.calc_normals_split()
+        mesh.loops.foreach_get('normal', normals)
+    return normals
+            
+def SplitPassNames(passes):
+    return [name.strip().casefold() for name in passes.split(',')]
+
+def FindPassInput(node, passes):
+    # Last of the pass names the node has an input for
+    pass_input = None
+    for name in passes:
+        for tmp_input in node.inputs:
+            if tmp_input.name.casefold() == name:
+                pass_input = tmp_input
+                break
+    return pass_input
+
+def ActiveMaterialOutput(nodes):
+    for node in nodes:
+        if node.type == 'OUTPUT_MATERIAL' and node.is_active_output:
+            return node
+    return None
+
+def PassInputs(node, passes):
+    # Pass inputs of the shader nodes the node's shader inputs lead to, the nodes a pass bake reads
+    if not any(input.type == 'SHADER' for input in node.inputs):
+        return [FindPassInput(node, passes)]
+    pass_inputs = []
+    for input in node.inputs:
+        if input.type == 'SHADER' and len(input.links):
+            pass_inputs += PassInputs(input.links[0].from_node, passes)
+    return pass_inputs
+
 def IsValidMesh(self, obj):
     if obj.type != 'MESH':
         self.report(type = {'WARNING'}, message = 'Object ' + obj.name + ' is not mesh type')
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import tracemalloc
+from functools import wraps
+from contextlib import contextmanager
+import bpy
+
+from .bakelab_plan import ImageBytes
+
+def ImageArgs(image):
+    width, height = image.size
+    return {
+        'image'        : image.name,
+        'width'        : width,
+        'height'       : height,
+        'buffer_bytes' : ImageBytes(width, height, image.is_float)
+    }
+
+def image_buffer_bytes():
+    # Images with pixels loaded, packed files not counted
+    return sum(ImageBytes(image.size[0], image.size[1], image.is_float) for image in bpy.data.images if image.has_data)
+
+class NullTracer:
+    """Tracer used when tracing is off, stages cost nothing"""
+    @contextmanager
+    def Stage(self, name, **args):
+        yield args
+
+    def Write(self, directory, name):
+        return None
+
+class Tracer:
+    """Stages of a run as Chrome trace events, for chrome://tracing or ui.perfetto.dev"""
+    def __init__(self):
+        self.pid = os.getpid()
+        self.events = [{
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+            'args': {'name': 'BakeLab'}
+        }]
+        self.open = [] # (name, start, args) of stages not ended yet
+        self.start_time = time.perf_counter()
+        self.own_tracemalloc = not tracemalloc.is_tracing()
+        if self.own_tracemalloc:
+            tracemalloc.start()
+
+    def timestamp(self):
+        return (time.perf_counter() - self.start_time) * 1e6 # Microseconds
+
+    def end(self, stage, args):
+        name, start, _ = stage
+        now = self.timestamp()
+        python_bytes, python_peak = tracemalloc.get_traced_memory()
+        args['python_bytes'] = python_bytes
+        args['python_peak'] = python_peak
+        self.events.append({
+            'name': name, 'cat': 'bakelab', 'ph': 'X', 'pid': self.pid, 'tid': 0,
+            'ts': start, 'dur': now - start, 'args': args
+        })
+        self.events.append({
+            'name': 'memory', 'ph': 'C', 'pid': self.pid, 'tid': 0, 'ts': now,
+            'args': {'python': python_bytes, 'images': image_buffer_bytes()}
+        })
+
+    @contextmanager
+    def Stage(self, name, **args):
+        # Args can be added inside the stage, e.g. the size of an image it made
+        stage = (name, self.timestamp(), args)
+        self.open.append(stage)
+        try:
+            yield args
+        finally:
+            if stage in self.open: # Not already ended by Write
+                self.open.remove(stage)
+                self.end(stage, args)
+
+    def Write(self, directory, name):
+        # Stages left open by a cancelled run end here
+        for stage in reversed(self.open):
+            args = dict(stage[2], unfinished = True)
+            self.end(stage, args)
+        self.open.clear()
+        if self.own_tracemalloc:
+            tracemalloc.stop()
+        filepath = os.path.join(directory, 'bakelab_trace_' + name + time.strftime('_%Y%m%d_%H%M%S') + '.json')
+        try:
+            os.makedirs(directory, exist_ok = True)
+            with open(filepath, 'w') as file:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, file)
+        except OSError:
+            return None
+        return filepath
+
+def OpenTracer(props):
+    if not props.use_trace:
+        return NullTracer()
+    return Tracer()
+
+def TraceDir(props):
+    # Next to the saved images, or next to the blend file when they are packed
+    if props.save_or_pack == 'SAVE' and props.save_path:
+        return bpy.path.abspath(props.save_path)
+    if bpy.data.filepath:
+        return os.path.dirname(bpy.data.filepath)
+    return bpy.app.tempdir
+
+def TracedOperator(name):
+    # Wraps an operator's execute in a stage and writes its trace, self.tracer is open meanwhile
+    def decorate(execute):
+        @wraps(execute)
+        def traced_execute(self, context):
+            props = context.scene.BakeLabProps
+            self.tracer = OpenTracer(props)
+            with self.tracer.Stage(name):
+                result = execute(self, context)
+            filepath = self.tracer.Write(TraceDir(props), name)
+            self.tracer = NullTracer()
+            if filepath is not None:
+                self.report(type = {'INFO'}, message = 'Trace written to ' + filepath)
+            return result
+        return traced_execute
+    return decorate
@@ -2,6 +2,8 @@ from bpy.types import (
             Panel
         )
 
+from .bakelab_map import DENOISE_MAPS
+
 class BakeLabUI(Panel):
     bl_label = "BakeLab"
     bl_space_type = 'VIEW_3D'
@@ -24,6 +26,30 @@ class BakeLabUI(Panel):
             row = layout.row(align = True)
             row.operator("bakelab.unwrap", icon='UV')
             row.operator("bakelab.clear_uv", icon='UV')
+            
+            box = layout.box()
+            col = box.column(align = True)
+            col.operator("bakelab.plan", icon='INFO')
+            if props.plan_error:
+                col.label(text = props.plan_error, icon = 'ERROR')
+            elif props.plan_cost:
+                row = col.row()
+                row.label(text = 'Images:')
+                row.label(text = str(props.plan_job_count))
+                row = col.row()
+                row.label(text = 'Cost:')
+                row.label(text = props.plan_cost)
+                if props.plan_time:
+                    row = col.row()
+                    row.label(text = 'Time:')
+                    row.label(text = props.plan_time)
+                row = col.row()
+                row.label(text = 'Peak Memory:')
+                row.label(text = props.plan_memory)
+                if props.plan_uv_coverage:
+                    row = col.row()
+                    row.label(text = 'UV Coverage:')
+                    row.label(text = props.plan_uv_coverage)
 
             layout.separator()
             
@@ -38,6 +64,20 @@ class BakeLabUI(Panel):
                 col.use_property_split = True
                 col.use_property_decorate = False
                 col.prop(props, "bake_margin")
+                col.prop(props, "incremental_bake")
+                col.prop(props, "pack_scalar_passes")
+                col.prop(props, "tiled_bake")
+                if props.tiled_bake:
+                    col.prop(props, "tile_size")
+                col.prop(props, "use_bake_cache")
+                if props.use_bake_cache:
+                    col.prop(props, "cache_path")
+                    col.prop(props, "cache_size_limit")
+                col.prop(props, "use_bake_history")
+                col.prop(props, "use_trace")
+                if props.bake_mode == "INDIVIDUAL":
+                    col.prop(props, "batch_bake")
+                    col.prop(props, "share_identical")
                 if props.bake_mode == "TO_ACTIVE":
                     col.prop(props, "cage_extrusion")
                 if props.bake_mode == "ALL_TO_ONE":
@@ -45,6 +85,20 @@ class BakeLabUI(Panel):
                     col.prop(props, "pre_join_mesh")
                     if props.pre_join_mesh:
                         col.prop(props, "cage_extrusion")
+                    else:
+                        col.prop(props, "batch_bake")
+                col.prop(props, "memory_budget")
+                if props.memory_budget > 0:
+                    col.prop(props, "memory_strategy")
+                col.separator()
+                col.prop(props, "use_bake_farm")
+                if props.use_bake_farm:
+                    col.prop(props, "farm_workers")
+                    col.prop(props, "farm_threads")
+                    if props.bake_mode == "INDIVIDUAL":
+                        col.prop(props, "farm_objects_per_job")
+                    col.prop(props, "farm_timeout")
+                    col.prop(props, "farm_retries")
             
             layout.separator()
             
@@ -65,9 +119,12 @@ class BakeLabUI(Panel):
                     row.prop(props, "image_min_size")
                     row.prop(props, "image_max_size")
                     col.prop(props, "round_adaptive_image")
+                    col.prop(props, "crop_uv_bounds")
                 
             layout.use_property_split = True
             layout.prop(props, "anti_alias")
+            if props.anti_alias > 1:
+                layout.prop(props, "aa_mode")
             layout.prop(props, "save_or_pack", expand=True)
             layout.use_property_split = False
             if props.save_or_pack == "SAVE":
@@ -105,6 +162,9 @@ class BakeLabUI(Panel):
                     box = subcol.box()
                     scol = box.column()
                     scol.prop(item, 'aa_override')
+                    scol.prop(item, 'cycles_profile')
+                    if item.type in DENOISE_MAPS:
+                        scol.prop(item, 'denoise')
                     if item.type != 'CustomPass':
                         scol.prop(item, 'color_space')
                     if item.type in {
@@ -178,6 +238,11 @@ class BakeLabUI(Panel):
                 col.separator()
                     
                 col.prop(item, "samples")
+                col.prop(item, "progressive")
+                if item.progressive:
+                    col.prop(item, "progressive_step")
+                    col.prop(item, "noise_threshold")
+                    col.prop(item, "time_limit")
                 
                 col.separator()
                 col.prop(item, "img_name")
@@ -220,39 +285,53 @@ class BakeLabUI(Panel):
         else:
             if props.bake_state == 'BAKING':
                 layout.label(text = 'Baking', icon = 'RENDER_STILL')
-                if props.bake_mode == 'INDIVIDUAL':
+                if props.use_bake_farm:
                     row = layout.row()
-                    row.label(text = 'Objects:')
+                    row.label(text = 'Jobs:')
+                    row.label(text = props.baking_farm_status)
+                else:
+                    if props.bake_mode == 'INDIVIDUAL':
+                        row = layout.row()
+                        row.label(text = 'Objects:')
+                        row.label(
+                            text = 
+                                str(props.baking_obj_index) + ' of ' + 
+                                str(props.baking_obj_count)
+                        )
+                    row = layout.row()
+                    row.label(text = 'Maps:')
                     row.label(
                         text = 
-                            str(props.baking_obj_index) + ' of ' + 
-                            str(props.baking_obj_count)
+                            str(props.baking_map_index) + ' of ' + 
+                            str(props.baking_map_count)
                     )
-                row = layout.row()
-                row.label(text = 'Maps:')
-                row.label(
-                    text = 
-                        str(props.baking_map_index) + ' of ' + 
-                        str(props.baking_map_count)
-                )
                 
-                layout.separator()
+                    layout.separator()
+                
+                    if props.bake_mode == 'INDIVIDUAL':
+                        row = layout.row()
+                        row.label(text = 'Current Object:')
+                        row.label(text = props.baking_obj_name)
                 
-                if props.bake_mode == 'INDIVIDUAL':
                     row = layout.row()
-                    row.label(text = 'Current Object:')
-                    row.label(text = props.baking_obj_name)
+                    row.label(text = 'Current Image:')
+                    row.label(text = props.baking_map_name)
+                    row = layout.row()
+                    row.label(text = '')
+                    row.label(text = props.baking_map_size)
                 
-                row = layout.row()
-                row.label(text = 'Current Image:')
-                row.label(text = props.baking_map_name)
-                row = layout.row()
-                row.label(text = '')
-                row.label(text = props.baking_map_size)
+                    row = layout.row()
+                    row.label( text = 'Type:')
+                    row.label( text = props.baking_map_type)
                 
-                row = layout.row()
-                row.label( text = 'Type:')
-                row.label( text = props.baking_map_type)
+                if props.baking_eta:
+                    row = layout.row()
+                    row.label(text = 'Remaining:')
+                    row.label(text = props.baking_eta)
+                if props.baking_throughput:
+                    row = layout.row()
+                    row.label(text = 'Speed:')
+                    row.label(text = props.baking_throughput)
                 layout.template_running_jobs()
             elif props.bake_state == 'BAKED':
                 layout.label(text = 'Baked', icon = 'CHECKMARK')
@@ -14,14 +14,11 @@ from bpy.props import (
 from .bakelab_tools import (
     SelectObject,
     SelectObjects,
+    ObjectContext,
+    MakeSingleUser,
     IsValidMesh
 )
 
-def SelectObject(obj):
-    bpy.ops.object.select_all(action = 'DESELECT')
-    obj.select_set(True)
-    bpy.context.view_layer.objects.active = obj
-    
 class Unwrapper(Operator):
     """Unwrap"""
     bl_idname = "bakelab.unwrap"
@@ -174,20 +171,15 @@ class Unwrapper(Operator):
         bpy.ops.object.mode_set(mode = 'OBJECT')
         
     def modifier_apply(self, context, obj):
-        active_object    = context.active_object
-        selected_objects = context.selected_objects
-        
-        SelectObject(obj)
-        if obj.data.users > 1:
-            bpy.ops.object.make_single_user(object=True,obdata=True)
+        MakeSingleUser(obj)
         
-        for modifier in obj.modifiers:
+        # Applying removes the modifier, iterate over a copy
+        for modifier in list(obj.modifiers):
             if modifier.show_render:
                 if modifier.type == 'SUBSURF':
                     modifier.levels = modifier.render_levels
-                bpy.ops.object.modifier_apply(modifier = modifier.name)
-        
-        SelectObjects(active_object, selected_objects)
+                with ObjectContext(context, obj, [obj]):
+                    bpy.ops.object.modifier_apply(modifier = modifier.name)
     
     def execute(self,context):
         active_object    = context.active_object
@@ -198,9 +190,9 @@ class Unwrapper(Operator):
             return {'CANCELLED'}
         ############################################################################
         if self.unwrap_mode == 'INDIVIDUAL':
-            SelectObjects(mesh_objects[0], mesh_objects)
             if self.make_single_user:
-                bpy.ops.object.make_single_user(object=True, obdata=True)
+                for obj in mesh_objects:
+                    MakeSingleUser(obj)
                 unwrap_objects = mesh_objects
             else:
                 unwrap_objects = []
@@ -241,7 +233,7 @@ class Unwrapper(Operator):
             SelectObject(active_object)
             
             if self.make_single_user:
-                bpy.ops.object.make_single_user(object=True,obdata=True)
+                MakeSingleUser(active_object)
                 
             if self.apply_modifiers:
                 self.modifier_apply(context, active_object)
@@ -256,8 +248,9 @@ class Unwrapper(Operator):
             
         ############################################################################
         elif self.unwrap_mode == 'ALL_TO_ONE':
-            SelectObjects(mesh_objects[0], mesh_objects)
-            bpy.ops.object.make_single_user(object=True, obdata=True)
+            for obj in mesh_objects:
+                MakeSingleUser(obj)
+            SelectObjects(mesh_objects[0], mesh_objects) # Edit mode works on the selection
             
             if self.uvmap_options == 'CREATE_NEW':
                 for obj in mesh_objects: